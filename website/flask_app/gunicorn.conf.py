@@ -0,0 +1,22 @@
+"""
+Gunicorn configuration for Toronto AI Weather Flask application.
+"""
+
+import multiprocessing
+import os
+
+bind = '0.0.0.0:5000'
+
+# Routes spend most of their time waiting on the database, Redis and the
+# weather service, so each worker multiplexes many requests on greenlets.
+# The gevent worker monkey-patches the standard library itself before the
+# application is imported (the app is not preloaded), so src.main stays
+# unpatched for Celery and the development server.
+worker_class = 'gevent'
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+def post_fork(server, worker):
+    """Make psycopg2 yield to other greenlets while waiting on PostgreSQL."""
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
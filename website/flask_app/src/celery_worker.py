@@ -22,6 +22,10 @@ celery.conf.beat_schedule = {
         'task': 'src.tasks.update_system_metrics',
         'schedule': 60.0,  # Every minute
     },
+    'precompute-dashboard-charts': {
+        'task': 'src.tasks.precompute_dashboard_charts',
+        'schedule': 60.0,  # Every minute
+    },
     'process-weather-data': {
         'task': 'src.tasks.process_weather_data',
         'schedule': 300.0,  # Every 5 minutes
@@ -11,9 +11,11 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))  # DON'T CHANGE T
 
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import scoped_session, sessionmaker
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_wtf.csrf import CSRFProtect
 from flask_cors import CORS
+from flask_caching import Cache
 import json
 import datetime
 import random
@@ -22,16 +24,36 @@ import math
 # Import pure Python utilities instead of native dependencies
 from src.utils.pure_weather import get_current_weather, get_forecast, get_historical_data
 from src.utils.pure_visualization import generate_chart_data, generate_map_data
+from src.utils.json_provider import OrjsonProvider
 
 # Create Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'toronto-ai-weather-secret-key')
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///toronto_weather.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'insertmanyvalues_page_size': 10000}
+app.config['CACHE_TYPE'] = 'RedisCache' if os.environ.get('REDIS_URL') else 'SimpleCache'
+app.config['CACHE_REDIS_URL'] = os.environ.get('REDIS_URL')
+app.config['CACHE_DEFAULT_TIMEOUT'] = 60
+app.json = OrjsonProvider(app)
 
 # Initialize extensions
 db = SQLAlchemy(app)
 csrf = CSRFProtect(app)
+
+# Session for read-only endpoints: autocommit, so reads never open a
+# transaction that has to be committed or rolled back
+with app.app_context():
+    ReadSession = scoped_session(sessionmaker(
+        bind=db.engine.execution_options(isolation_level='AUTOCOMMIT'),
+        autoflush=False
+    ))
+
+@app.teardown_appcontext
+def remove_read_session(exception=None):
+    ReadSession.remove()
+
+cache = Cache(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'auth.login'
 CORS(app)
@@ -47,6 +69,10 @@ from src.routes.weather import weather_bp
 from src.routes.api import api_bp
 from src.routes.admin import admin_bp
 
+# The JSON API authenticates with API keys, not session cookies, so CSRF
+# tokens do not apply; session-authenticated key management re-checks them
+csrf.exempt(api_bp)
+
 # Register blueprints
 app.register_blueprint(main_bp)
 app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -78,9 +104,12 @@ def inject_globals():
         'user_count': User.query.count()
     }
 
-# Create database tables
+# Create database tables, then bring tables created by older versions up to date
+from src.utils.migrations import run_migrations
+
 with app.app_context():
     db.create_all()
+    run_migrations()
 
 # Run the app
 if __name__ == '__main__':
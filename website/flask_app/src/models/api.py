@@ -3,6 +3,7 @@ API models for Toronto AI Weather web application.
 """
 
 from datetime import datetime
+import hashlib
 import secrets
 from src.main import db
 
@@ -12,8 +13,10 @@ class ApiKey(db.Model):
     __tablename__ = 'api_keys'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    key = db.Column(db.String(64), unique=True, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    key = db.Column(db.String(64), unique=True, index=True)  # Legacy plaintext keys only
+    key_hash = db.Column(db.LargeBinary(16), unique=True, index=True)
+    key_prefix = db.Column(db.String(8))
     name = db.Column(db.String(64))
     description = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=True)
@@ -26,7 +29,10 @@ class ApiKey(db.Model):
     
     def __init__(self, user_id, name, description=None, expires_at=None):
         self.user_id = user_id
-        self.key = self.generate_key()
+        # Only the digest is stored; the raw key is shown to the owner once
+        self.raw_key = self.generate_key()
+        self.key_hash = self.hash_key(self.raw_key)
+        self.key_prefix = self.raw_key[:8]
         self.name = name
         self.description = description
         self.expires_at = expires_at
@@ -36,6 +42,11 @@ class ApiKey(db.Model):
         """Generate a secure API key."""
         return secrets.token_hex(32)
     
+    @staticmethod
+    def hash_key(key):
+        """Hash an API key for storage and lookup."""
+        return hashlib.blake2b(key.encode(), digest_size=16).digest()
+    
     def is_expired(self):
         """Check if the API key is expired."""
         if not self.expires_at:
@@ -80,7 +91,7 @@ class ApiQuota(db.Model):
     __tablename__ = 'api_quotas'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     tier = db.Column(db.String(20))
     daily_limit = db.Column(db.Integer)
     monthly_limit = db.Column(db.Integer)
@@ -6,8 +6,18 @@ and their contributions to the distributed computation network.
 """
 
 from datetime import datetime
+from sqlalchemy import literal_column
 from src.main import db
 
+# Contribution weight per device type; other types count as 1.0
+CONTRIBUTION_BASE_LEVELS = {
+    'server': 10.0,
+    'desktop': 5.0,
+    'laptop': 3.0,
+    'tablet': 1.0,
+    'mobile': 0.5
+}
+
 class Device(db.Model):
     """Device model for tracking connected devices and their contributions."""
     
@@ -25,6 +35,15 @@ class Device(db.Model):
     performance_score = db.Column(db.Float, default=0.0)
     is_active = db.Column(db.Boolean, default=True)
     
+    __table_args__ = (
+        # Partial index: only active devices, so active-device counts stay index-only
+        db.Index(
+            'ix_device_active', 'id',
+            postgresql_where=is_active.is_(True),
+            sqlite_where=is_active.is_(True)
+        ),
+    )
+    
     def update_connection(self):
         """Update last connected time."""
         self.last_connected = datetime.utcnow()
@@ -47,16 +66,57 @@ class Device(db.Model):
     
     def get_contribution_level(self):
         """Get contribution level based on device type and performance."""
-        base_levels = {
-            'server': 10.0,
-            'desktop': 5.0,
-            'laptop': 3.0,
-            'tablet': 1.0,
-            'mobile': 0.5
-        }
-        
-        base = base_levels.get(self.device_type, 1.0)
+        base = CONTRIBUTION_BASE_LEVELS.get(self.device_type, 1.0)
         return base * (self.performance_score / 100)
     
     def __repr__(self):
         return f'<Device {self.device_id}>'
+
+# One device per user, address, type and browser; register_device upserts on
+# it. NULLs are folded to a sentinel so they compare equal, as PostgreSQL
+# before 15 has no NULLS NOT DISTINCT. The sentinels are literal SQL so the
+# ON CONFLICT target matches the index expressions exactly.
+DEVICE_IDENTITY = (
+    db.func.coalesce(Device.user_id, literal_column('0')),
+    db.func.coalesce(Device.ip_address, literal_column("''")),
+    db.func.coalesce(Device.device_type, literal_column("''")),
+    db.func.coalesce(Device.browser_type, literal_column("''")),
+)
+db.Index('ix_device_identity', *DEVICE_IDENTITY, unique=True)
+
+class SystemMetrics(db.Model):
+    """Snapshot of system-wide metrics, recorded every minute by the metrics task."""
+    
+    __tablename__ = 'system_metrics'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    active_devices = db.Column(db.Integer, default=0)
+    total_devices = db.Column(db.Integer, default=0)
+    total_computation_time = db.Column(db.Integer, default=0)  # in seconds
+    total_tasks_completed = db.Column(db.Integer, default=0)
+    average_performance = db.Column(db.Float, default=0.0)
+    system_load = db.Column(db.Float, default=0.0)  # share of devices active, 0-1
+    average_prediction_accuracy = db.Column(db.Float, default=0.0)  # 0-1
+    
+    __table_args__ = (
+        # Admin views page newest first on (timestamp, id)
+        db.Index('ix_system_metrics_ts', timestamp, id),
+    )
+    
+    def __repr__(self):
+        return f'<SystemMetrics at {self.timestamp}>'
+    
+    def to_dict(self):
+        """Convert to dictionary (datetimes are left for the JSON provider)."""
+        return {
+            'id': self.id,
+            'timestamp': self.timestamp,
+            'active_devices': self.active_devices,
+            'total_devices': self.total_devices,
+            'total_computation_time': self.total_computation_time,
+            'total_tasks_completed': self.total_tasks_completed,
+            'average_performance': self.average_performance,
+            'system_load': self.system_load,
+            'average_prediction_accuracy': self.average_prediction_accuracy
+        }
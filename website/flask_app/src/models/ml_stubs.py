@@ -6,12 +6,20 @@ that would normally be powered by TensorFlow. These stubs return realistic
 mock data for demonstration purposes.
 """
 
-import numpy as np
-import pandas as pd
 import random
+import math
 from datetime import datetime, timedelta
 import json
 import os
+from functools import lru_cache
+
+# Season factors (-1 to 1, 1 is peak summer) indexed by month - 1.
+# Northern hemisphere summer peaks in July, southern in January.
+_SEASON_N = tuple(math.cos((m - 7) * math.pi / 6) for m in range(1, 13))
+_SEASON_S = tuple(math.cos((m - 1) * math.pi / 6) for m in range(1, 13))
+
+# Diurnal temperature variation indexed by hour of day
+_DIURNAL = tuple(3 * math.sin(math.pi * (h - 4) / 12) for h in range(24))
 
 
 class WeatherPredictionModelStub:
@@ -188,12 +196,7 @@ class WeatherPredictionModelStub:
         is_northern = latitude >= 0
         
         # Determine season factor (-1 to 1, where 1 is peak summer, -1 is peak winter)
-        if is_northern:
-            # Northern hemisphere: Summer peaks in July (month 7)
-            season_factor = math.cos((month - 7) * math.pi / 6)
-        else:
-            # Southern hemisphere: Summer peaks in January (month 1)
-            season_factor = math.cos((month - 1) * math.pi / 6)
+        season_factor = (_SEASON_N if is_northern else _SEASON_S)[month - 1]
         
         # Base temperature varies with latitude (equator is warmest)
         equator_max_temp = 30  # Celsius
@@ -213,7 +216,7 @@ class WeatherPredictionModelStub:
         """Calculate temperature variation based on time of day."""
         # Temperature typically peaks around 2-3 PM (hour 14-15) and bottoms out around 4-5 AM (hour 4-5)
         # Using a sinusoidal pattern with peak at hour 14
-        return 3 * math.sin(math.pi * (hour - 4) / 12)
+        return _DIURNAL[hour]
 
 
 class AnomalyDetectionModelStub:
@@ -298,20 +301,17 @@ class AnomalyDetectionModelStub:
         }
 
 
-# Add missing math module import
-import math
-
-
 # Factory function to get model instances
+@lru_cache(maxsize=None)
 def get_model(model_type):
     """
-    Get a model instance based on type.
+    Get a shared model instance based on type.
     
     Args:
         model_type: String identifier for the model type
         
     Returns:
-        Model instance
+        Model instance (the same instance is returned for repeated calls)
     """
     if model_type == 'weather_prediction':
         return WeatherPredictionModelStub()
@@ -319,3 +319,8 @@ def get_model(model_type):
         return AnomalyDetectionModelStub()
     else:
         raise ValueError(f"Unknown model type: {model_type}")
+
+
+def reset_models():
+    """Discard cached model instances so the next get_model() call rebuilds them."""
+    get_model.cache_clear()
@@ -4,10 +4,16 @@ User model for Toronto AI Weather.
 This module provides the User model for authentication and authorization.
 """
 
+from flask import current_app
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
-from src.main import db
+import hashlib
+import hmac
+from src.main import db, cache
+
+# How long a successful password check is remembered, so retried logins skip the hash
+PASSWORD_CHECK_CACHE_TTL = 60
 
 class User(db.Model, UserMixin):
     """User model for authentication and authorization."""
@@ -25,7 +31,9 @@ class User(db.Model, UserMixin):
     is_approved = db.Column(db.Boolean, default=False)
     
     # Relationships
-    devices = db.relationship('Device', backref='user', lazy='dynamic')
+    devices = db.relationship('Device', backref='user')
+    api_keys = db.relationship('ApiKey', backref='user')
+    api_quota = db.relationship('ApiQuota', backref='user', uselist=False)
     
     def set_password(self, password):
         """Set password hash."""
@@ -33,7 +41,21 @@ class User(db.Model, UserMixin):
     
     def check_password(self, password):
         """Check password against hash."""
-        return check_password_hash(self.password_hash, password)
+        # Only successful checks are cached, under an HMAC of the stored hash and
+        # the candidate, so a password change or a wrong password never hits
+        cache_key = 'auth:pw:' + hmac.new(
+            current_app.config['SECRET_KEY'].encode(),
+            f'{self.password_hash}:{password}'.encode(),
+            hashlib.sha256
+        ).hexdigest()
+        if cache.get(cache_key):
+            return True
+        
+        if not check_password_hash(self.password_hash, password):
+            return False
+        
+        cache.set(cache_key, True, timeout=PASSWORD_CHECK_CACHE_TTL)
+        return True
     
     def get_full_name(self):
         """Get user's full name."""
@@ -3,8 +3,21 @@ Weather data models for Toronto AI Weather web application.
 """
 
 from datetime import datetime
+from sqlalchemy.orm import validates
 from src.main import db
 
+COORDINATE_PRECISION = 2  # decimal places, roughly a 1 km grid
+
+def quantize_coordinate(value):
+    """Snap a latitude or longitude to the shared lookup grid."""
+    return round(value, COORDINATE_PRECISION)
+
+def _quantized(column):
+    """Column default that snaps another column's value to the lookup grid."""
+    def default(context):
+        return quantize_coordinate(context.get_current_parameters()[column])
+    return default
+
 class Location(db.Model):
     """Location model for weather data."""
     
@@ -14,16 +27,31 @@ class Location(db.Model):
     name = db.Column(db.String(120))
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
+    lat_q = db.Column(db.Float, default=_quantized('latitude'))
+    lon_q = db.Column(db.Float, default=_quantized('longitude'))
     country = db.Column(db.String(64))
     region = db.Column(db.String(64))
     city = db.Column(db.String(64))
     timezone = db.Column(db.String(64))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # API endpoints resolve locations by exact coordinates
+        db.Index('ix_location_latlon', latitude, longitude),
+        # API lookups snap coordinates to the grid so nearby requests share a row
+        db.Index('ix_location_grid', lat_q, lon_q),
+    )
+    
     # Relationships
     weather_data = db.relationship('WeatherData', backref='location', lazy='dynamic')
     forecasts = db.relationship('Forecast', backref='location', lazy='dynamic')
     
+    @validates('latitude', 'longitude')
+    def _sync_grid(self, key, value):
+        """Keep the grid column in step when a coordinate is set or changed."""
+        setattr(self, 'lat_q' if key == 'latitude' else 'lon_q', quantize_coordinate(value))
+        return value
+    
     def __repr__(self):
         return f'<Location {self.name} ({self.latitude}, {self.longitude})>'
 
@@ -52,15 +80,23 @@ class WeatherData(db.Model):
     source = db.Column(db.String(64))
     accuracy = db.Column(db.Float)
     
+    __table_args__ = (
+        # "Latest N readings for a location" is served straight from the index
+        db.Index('ix_weather_loc_ts', location_id, timestamp.desc()),
+        # Day-window scans across all locations (accuracy task); readings are
+        # appended in time order, so a BRIN index stays tiny
+        db.Index('ix_weather_ts_brin', timestamp, postgresql_using='brin'),
+    )
+    
     def __repr__(self):
         return f'<WeatherData {self.location_id} at {self.timestamp}>'
     
     def to_dict(self):
-        """Convert to dictionary."""
+        """Convert to dictionary (datetimes are left for the JSON provider)."""
         return {
             'id': self.id,
             'location_id': self.location_id,
-            'timestamp': self.timestamp.isoformat(),
+            'timestamp': self.timestamp,
             'temperature': self.temperature,
             'feels_like': self.feels_like,
             'humidity': self.humidity,
@@ -106,16 +142,22 @@ class Forecast(db.Model):
     confidence = db.Column(db.Float)
     model_version = db.Column(db.String(64))
     
+    __table_args__ = (
+        db.Index('ix_forecast_loc_ts', location_id, forecast_timestamp),
+        # Forecasts are appended roughly in time order, so a BRIN index stays tiny
+        db.Index('ix_forecast_ts_brin', forecast_timestamp, postgresql_using='brin'),
+    )
+    
     def __repr__(self):
         return f'<Forecast {self.location_id} for {self.forecast_timestamp}>'
     
     def to_dict(self):
-        """Convert to dictionary."""
+        """Convert to dictionary (datetimes are left for the JSON provider)."""
         return {
             'id': self.id,
             'location_id': self.location_id,
-            'prediction_timestamp': self.prediction_timestamp.isoformat(),
-            'forecast_timestamp': self.forecast_timestamp.isoformat(),
+            'prediction_timestamp': self.prediction_timestamp,
+            'forecast_timestamp': self.forecast_timestamp,
             'temperature': self.temperature,
             'feels_like': self.feels_like,
             'humidity': self.humidity,
@@ -151,6 +193,13 @@ class WeatherAlert(db.Model):
     issuing_authority = db.Column(db.String(120))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_alert_end_time', end_time.desc()),
+        db.Index('ix_alert_loc_end_time', location_id, end_time),
+        # Newest-first listings (admin dashboard) stop after the first K matches
+        db.Index('ix_alert_created_at', created_at.desc()),
+    )
+    
     def __repr__(self):
         return f'<WeatherAlert {self.alert_type} for {self.location_id}>'
 
@@ -173,5 +222,14 @@ class PredictionAccuracy(db.Model):
     overall_accuracy = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_accuracy_forecast_actual', forecast_id, actual_weather_id),
+        # Covers the accuracy_stats aggregates so they can use an index-only scan
+        db.Index(
+            'ix_accuracy_created_errors',
+            created_at, overall_accuracy, temperature_error, humidity_error, precipitation_error
+        ),
+    )
+    
     def __repr__(self):
         return f'<PredictionAccuracy {self.forecast_id} vs {self.actual_weather_id}>'
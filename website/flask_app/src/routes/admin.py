@@ -2,29 +2,237 @@
 Admin routes for Toronto AI Weather web application.
 """
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import (Blueprint, render_template, stream_template, redirect, url_for, flash, request,
+                   jsonify, abort, g, make_response)
 from flask_login import login_required, current_user
+from functools import wraps
+from collections import defaultdict
+from sqlalchemy import insert, update, delete, select, lambda_stmt, text, literal, union_all, bindparam
+from sqlalchemy.orm import selectinload, raiseload
+from werkzeug.security import generate_password_hash
 from datetime import datetime
+import hashlib
+import time
 
-from src.main import db
+from src.main import db, cache
 from src.models.user import User, UserTier, RegistrationRequest
 from src.models.weather import Location, WeatherData, Forecast, WeatherAlert
-from src.models.device import Device, SystemMetrics
+from src.models.device import Device, DeviceContribution, SystemMetrics
 from src.models.api import ApiKey, ApiQuota
 
 admin_bp = Blueprint('admin', __name__)
 
+DASHBOARD_CACHE_KEY = 'admin:dashboard:v1'
+LOCATION_CHOICES_CACHE_KEY = 'admin:location_choices:v1'
+BULK_INSERT_CHUNK_SIZE = 10000
+MAX_LIST_PAGE_SIZE = 500
+
+# Daily and monthly API limits granted per tier on approval
+TIER_QUOTAS = {
+    UserTier.WEATHER_AGENCY: (10000, 300000),
+    UserTier.NEWS: (5000, 150000),
+    UserTier.GOVERNMENT: (20000, 600000),
+    UserTier.MILITARY: (50000, 1500000)
+}
+DEFAULT_QUOTA = (1000, 30000)
+
+def _approval_quota(tier):
+    """
+    API limits for a user approved into a tier.
+    
+    Returns:
+        tuple: (daily_limit, monthly_limit), or None for tiers without API access
+    """
+    if tier == UserTier.CIVILIAN:
+        return None
+    return TIER_QUOTAS.get(tier, DEFAULT_QUOTA)
+
+# Columns shown on the user detail page; secrets (password and API key
+# hashes, legacy plaintext keys) are never selected
+USER_DETAIL_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'role',
+    'created_at', 'last_login', 'is_active', 'is_approved'
+)
+DEVICE_DETAIL_FIELDS = (
+    'id', 'device_id', 'device_type', 'os_type', 'browser_type', 'ip_address',
+    'last_connected', 'first_connected', 'total_computation_time',
+    'total_tasks_completed', 'performance_score', 'is_active'
+)
+API_KEY_DETAIL_FIELDS = (
+    'id', 'key_prefix', 'name', 'description', 'is_active',
+    'expires_at', 'created_at', 'last_used'
+)
+API_QUOTA_DETAIL_FIELDS = (
+    'tier', 'daily_limit', 'monthly_limit', 'current_daily_usage',
+    'current_monthly_usage', 'reset_day', 'last_daily_reset', 'last_monthly_reset'
+)
+
+def _json_object_sql(alias, fields):
+    """jsonb_build_object(...) over the given columns of a table alias."""
+    return 'jsonb_build_object(' + ', '.join(f"'{f}', {alias}.{f}" for f in fields) + ')'
+
+# User detail view in one round trip on PostgreSQL: the user row with its
+# devices, API keys and quota aggregated as nested JSON
+USER_DETAIL_JSON_SQL = text(f"""
+    SELECT {_json_object_sql('u', USER_DETAIL_FIELDS)} || jsonb_build_object(
+        'devices', (SELECT coalesce(jsonb_agg({_json_object_sql('d', DEVICE_DETAIL_FIELDS)} ORDER BY d.id), '[]')
+                    FROM "{Device.__table__.name}" d WHERE d.user_id = u.id),
+        'api_keys', (SELECT coalesce(jsonb_agg({_json_object_sql('k', API_KEY_DETAIL_FIELDS)} ORDER BY k.id), '[]')
+                     FROM "{ApiKey.__table__.name}" k WHERE k.user_id = u.id),
+        'api_quota', (SELECT {_json_object_sql('q', API_QUOTA_DETAIL_FIELDS)}
+                      FROM "{ApiQuota.__table__.name}" q WHERE q.user_id = u.id LIMIT 1)
+    )
+    FROM "{User.__table__.name}" u
+    WHERE u.id = :uid
+""")
+
+def _detail_dict(source, model, fields):
+    """
+    Shape a user detail record the same way on every database.
+    
+    Args:
+        source: ORM object, or dict decoded from USER_DETAIL_JSON_SQL
+        model: Model class the record belongs to
+        fields (tuple): Columns to keep
+    
+    Returns:
+        dict: The fields, with timestamps as datetime objects
+    """
+    if source is None:
+        return None
+    
+    record = {}
+    for field in fields:
+        value = source[field] if isinstance(source, dict) else getattr(source, field)
+        # JSON aggregation turns timestamps into ISO strings
+        if isinstance(value, str) and isinstance(model.__table__.c[field].type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        record[field] = value
+    return record
+
+# Hot dashboard statements, built once and reused from SQLAlchemy's lambda cache
+PENDING_COUNT_STMT = lambda_stmt(
+    lambda: select(db.func.count(RegistrationRequest.id))
+    .where(RegistrationRequest.status == 'pending')
+)
+ACTIVE_DEVICES_STMT = lambda_stmt(
+    lambda: select(db.func.count(Device.id))
+    .where(Device.is_active.is_(True))
+)
+
+def _recent_alerts_stmt(now):
+    """Five newest alerts still active at ``now`` (``now`` is a bound parameter)."""
+    return lambda_stmt(
+        lambda: select(WeatherAlert)
+        .where(WeatherAlert.end_time > now)
+        .order_by(WeatherAlert.created_at.desc())
+        .limit(5)
+    )
+
+# User columns an admin may overwrite from the edit form or bulk edit
+EDITABLE_USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+EDITABLE_USER_FLAGS = ('is_active',)
+
+def _keyset_page(query, per_page):
+    """
+    Fetch one page of a keyset-paginated query.
+    
+    One extra row is fetched as a sentinel so the caller knows whether
+    another page exists without running a COUNT.
+    
+    Returns:
+        tuple: (rows, next_cursor) where next_cursor is the id of the last
+        row on the page, or None on the final page
+    """
+    rows = query.limit(per_page + 1).all()
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        return rows, rows[-1].id
+    return rows, None
+
+def _list_page_size(default):
+    """Page size from ?per_page=, capped for large admin exports."""
+    per_page = request.args.get('per_page', default, type=int)
+    return max(1, min(per_page, MAX_LIST_PAGE_SIZE))
+
+def _version_key(name):
+    return f'admin:ver:{name}'
+
+def bump_list_version(name):
+    """Mark an admin list as changed so cached ETags stop matching."""
+    cache.set(_version_key(name), time.time_ns(), timeout=0)
+
+def _list_etag(name):
+    """
+    ETag for an admin list page: data version, query string and minute.
+    
+    Admin edits bump the version explicitly; the minute bucket bounds
+    staleness for changes made elsewhere (sign-ups, device registration,
+    alerts expiring) to one minute.
+    """
+    version = cache.get(_version_key(name))
+    if version is None:
+        version = time.time_ns()
+        cache.set(_version_key(name), version, timeout=0)
+    query = hashlib.sha1(request.query_string).hexdigest()[:12]
+    return f'{name}-{version}-{query}-{int(time.time() // 60)}'
+
+def _not_modified(etag):
+    response = make_response('', 304)
+    response.set_etag(etag)
+    return response
+
+def _with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 def admin_required(f):
     """Decorator to require admin access."""
     @login_required
+    @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not current_user.is_admin():
+        # Evaluate the admin check once per request, however many views or
+        # decorator layers ask for it
+        is_admin = g.get('_is_admin')
+        if is_admin is None:
+            is_admin = g._is_admin = current_user.is_admin()
+        if not is_admin:
             flash('Admin access required', 'danger')
             return redirect(url_for('main.index'))
         return f(*args, **kwargs)
-    decorated_function.__name__ = f.__name__
     return decorated_function
 
+@cache.cached(timeout=60, key_prefix=DASHBOARD_CACHE_KEY)
+def _dashboard_stats():
+    """Aggregate counts shown on the admin dashboard (cached briefly)."""
+    # Get user counts by role (a user's tier)
+    user_counts = db.session.query(
+        User.role, db.func.count(User.id)
+    ).group_by(User.role).all()
+    
+    # Get pending registration requests (plain COUNT, no subquery wrapper)
+    pending_requests = db.session.execute(PENDING_COUNT_STMT).scalar()
+    
+    # Get active devices
+    active_devices = db.session.execute(ACTIVE_DEVICES_STMT).scalar()
+    
+    return {
+        'user_counts': dict(user_counts),
+        'pending_requests': pending_requests,
+        'active_devices': active_devices
+    }
+
+def invalidate_dashboard_stats():
+    """Drop cached dashboard counts after a change that affects them."""
+    cache.delete(DASHBOARD_CACHE_KEY)
+
+@cache.cached(timeout=300, key_prefix=LOCATION_CHOICES_CACHE_KEY)
+def _location_choices():
+    """Id and name of every location for the alert form dropdown (cached)."""
+    rows = db.session.query(Location.id, Location.name).order_by(Location.name).all()
+    return [{'id': location_id, 'name': name} for location_id, name in rows]
+
 @admin_bp.route('/')
 @admin_required
 def index():
@@ -32,31 +240,21 @@ def index():
     # Get system metrics
     metrics = SystemMetrics.query.order_by(SystemMetrics.timestamp.desc()).first()
     
-    # Get user counts by tier
-    user_counts = db.session.query(
-        User.tier, db.func.count(User.id)
-    ).group_by(User.tier).all()
-    
-    # Get pending registration requests
-    pending_requests = RegistrationRequest.query.filter_by(
-        status='pending'
-    ).count()
-    
-    # Get active devices
-    active_devices = Device.query.filter_by(is_active=True).count()
+    # Get user, request and device counts
+    stats = _dashboard_stats()
     
     # Get recent alerts
-    recent_alerts = WeatherAlert.query.filter(
-        WeatherAlert.end_time > datetime.utcnow()
-    ).order_by(WeatherAlert.created_at.desc()).limit(5).all()
+    recent_alerts = db.session.execute(
+        _recent_alerts_stmt(datetime.utcnow())
+    ).scalars().all()
     
     return render_template(
         'admin/index.html',
         title='Admin Dashboard',
         metrics=metrics,
-        user_counts=dict(user_counts),
-        pending_requests=pending_requests,
-        active_devices=active_devices,
+        user_counts=stats['user_counts'],
+        pending_requests=stats['pending_requests'],
+        active_devices=stats['active_devices'],
         recent_alerts=recent_alerts
     )
 
@@ -64,77 +262,149 @@ def index():
 @admin_required
 def users():
     """User management."""
-    # Get all users with pagination
-    page = request.args.get('page', 1, type=int)
-    users = User.query.paginate(page=page, per_page=20)
-    
-    return render_template(
+    etag = _list_etag('users')
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
+    # Get users newest first, seeking past the previous page's last id;
+    # read-only list, so fetch plain rows of the rendered columns
+    after_id = request.args.get('after_id', type=int)
+    query = db.session.query(
+        User.id, User.username, User.email, User.role, User.is_active
+    ).order_by(User.id.desc())
+    if after_id:
+        query = query.filter(User.id < after_id)
+    users, next_cursor = _keyset_page(query, per_page=_list_page_size(20))
+    
+    return _with_etag(stream_template(
         'admin/users.html',
         title='User Management',
-        users=users
-    )
+        users=users,
+        next_cursor=next_cursor
+    ), etag)
 
 @admin_bp.route('/users/<int:user_id>')
 @admin_required
 def user_detail(user_id):
     """User detail view."""
-    user = User.query.get_or_404(user_id)
-    
-    # Get user's devices
-    devices = Device.query.filter_by(user_id=user.id).all()
-    
-    # Get user's API keys
-    api_keys = ApiKey.query.filter_by(user_id=user.id).all()
-    
-    # Get user's API quota
-    api_quota = ApiQuota.query.filter_by(user_id=user.id).first()
+    if db.engine.dialect.name == 'postgresql':
+        record = db.session.execute(USER_DETAIL_JSON_SQL, {'uid': user_id}).scalar()
+        if record is None:
+            abort(404)
+        devices, api_keys, api_quota = record['devices'], record['api_keys'], record['api_quota']
+    else:
+        # Elsewhere load the user with devices, API keys and quota in batched SELECTs;
+        # any other lazy load raises instead of silently querying per row
+        record = User.query.options(
+            selectinload(User.devices),
+            selectinload(User.api_keys),
+            selectinload(User.api_quota),
+            raiseload('*')
+        ).get_or_404(user_id)
+        devices, api_keys, api_quota = record.devices, record.api_keys, record.api_quota
+    
+    # Both paths hand the template plain dicts with the same keys and types
+    user = _detail_dict(record, User, USER_DETAIL_FIELDS)
     
     return render_template(
         'admin/user_detail.html',
-        title=f'User: {user.username}',
+        title=f"User: {user['username']}",
         user=user,
-        devices=devices,
-        api_keys=api_keys,
-        api_quota=api_quota
+        devices=[_detail_dict(device, Device, DEVICE_DETAIL_FIELDS) for device in devices],
+        api_keys=[_detail_dict(key, ApiKey, API_KEY_DETAIL_FIELDS) for key in api_keys],
+        api_quota=_detail_dict(api_quota, ApiQuota, API_QUOTA_DETAIL_FIELDS)
     )
 
 @admin_bp.route('/users/<int:user_id>/edit', methods=['POST'])
 @admin_required
 def edit_user(user_id):
     """Edit user."""
-    user = User.query.get_or_404(user_id)
-    
-    # Update user fields
-    user.username = request.form.get('username', user.username)
-    user.email = request.form.get('email', user.email)
-    user.first_name = request.form.get('first_name', user.first_name)
-    user.last_name = request.form.get('last_name', user.last_name)
-    user.tier = request.form.get('tier', user.tier)
-    user.organization = request.form.get('organization', user.organization)
-    user.is_active = request.form.get('is_active') == 'on'
-    user.is_verified = request.form.get('is_verified') == 'on'
+    # Update user fields with a single UPDATE, no load-then-flush round trip
+    values = {k: request.form[k] for k in EDITABLE_USER_FIELDS if k in request.form}
+    for flag in EDITABLE_USER_FLAGS:
+        values[flag] = request.form.get(flag) == 'on'
+    
+    result = db.session.execute(
+        update(User).where(User.id == user_id).values(**values)
+    )
+    if result.rowcount == 0:
+        abort(404)
     
     db.session.commit()
+    invalidate_dashboard_stats()
+    bump_list_version('users')
     
     flash('User updated successfully', 'success')
-    return redirect(url_for('admin.user_detail', user_id=user.id))
+    return redirect(url_for('admin.user_detail', user_id=user_id))
+
+@admin_bp.route('/users/bulk-edit', methods=['POST'])
+@admin_required
+def bulk_edit_users():
+    """Update many users from a JSON array of {id, field: value} objects."""
+    data = request.get_json()
+    
+    if not data or not isinstance(data, list):
+        return jsonify({'error': 'A list of users is required'}), 400
+    
+    allowed = {'id', *EDITABLE_USER_FIELDS, *EDITABLE_USER_FLAGS}
+    rows = []
+    for index, item in enumerate(data):
+        if not isinstance(item, dict) or 'id' not in item:
+            return jsonify({'error': f'User {index}: missing required field: id'}), 400
+        
+        unknown = sorted(set(item) - allowed)
+        if unknown:
+            return jsonify({'error': f"User {index}: unknown fields: {', '.join(unknown)}"}), 400
+        
+        row = {k: item[k] for k in EDITABLE_USER_FIELDS if k in item}
+        for flag in EDITABLE_USER_FLAGS:
+            if flag in item:
+                row[flag] = bool(item[flag])
+        row['id'] = item['id']
+        rows.append(row)
+    
+    # One executemany per set of edited fields; unlike the ORM bulk UPDATE,
+    # ids with no matching user are skipped and left out of the rowcount
+    groups = defaultdict(list)
+    for row in rows:
+        user_id = row.pop('id')
+        if row:
+            groups[tuple(sorted(row))].append({'b_id': user_id, **{f'b_{k}': v for k, v in row.items()}})
+    
+    updated = 0
+    for fields, params in groups.items():
+        updated += db.session.execute(
+            update(User.__table__)
+            .where(User.__table__.c.id == bindparam('b_id'))
+            .values({field: bindparam(f'b_{field}') for field in fields}),
+            params
+        ).rowcount
+    db.session.commit()
+    invalidate_dashboard_stats()
+    bump_list_version('users')
+    
+    return jsonify({'message': 'Users updated successfully', 'updated': updated}), 200
 
 @admin_bp.route('/users/<int:user_id>/reset-password', methods=['POST'])
 @admin_required
 def reset_user_password(user_id):
     """Reset user password."""
-    user = User.query.get_or_404(user_id)
-    
     password = request.form.get('password')
     if not password:
         flash('Password is required', 'danger')
-        return redirect(url_for('admin.user_detail', user_id=user.id))
+        return redirect(url_for('admin.user_detail', user_id=user_id))
     
-    user.set_password(password)
+    result = db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(password_hash=generate_password_hash(password))
+    )
+    if result.rowcount == 0:
+        abort(404)
     db.session.commit()
     
     flash('Password reset successfully', 'success')
-    return redirect(url_for('admin.user_detail', user_id=user.id))
+    return redirect(url_for('admin.user_detail', user_id=user_id))
 
 @admin_bp.route('/registration-requests')
 @admin_required
@@ -168,69 +438,121 @@ def approve_request(request_id):
         flash('User not found', 'danger')
         return redirect(url_for('admin.registration_requests'))
     
-    # Update user tier
-    user.tier = reg_request.requested_tier
-    user.organization = reg_request.organization
+    # Grant the requested tier; a user's tier is their role
+    user.role = reg_request.requested_tier
     
     # Update request status
     reg_request.status = 'approved'
     reg_request.processed_at = datetime.utcnow()
     reg_request.processed_by = current_user.id
     
-    db.session.commit()
-    
-    # Create API quota for user if needed
-    if user.can_access_api():
+    # Create API quota for user if needed (same transaction as the approval)
+    limits = _approval_quota(reg_request.requested_tier)
+    if limits:
         quota = ApiQuota.query.filter_by(user_id=user.id).first()
         
         if not quota:
-            # Set quota based on tier
-            daily_limit = 1000  # Default
-            monthly_limit = 30000  # Default
-            
-            if user.tier == UserTier.WEATHER_AGENCY:
-                daily_limit = 10000
-                monthly_limit = 300000
-            elif user.tier == UserTier.NEWS:
-                daily_limit = 5000
-                monthly_limit = 150000
-            elif user.tier == UserTier.GOVERNMENT:
-                daily_limit = 20000
-                monthly_limit = 600000
-            elif user.tier == UserTier.MILITARY:
-                daily_limit = 50000
-                monthly_limit = 1500000
+            daily_limit, monthly_limit = limits
             
             quota = ApiQuota(
                 user_id=user.id,
-                tier=user.tier,
+                tier=reg_request.requested_tier,
                 daily_limit=daily_limit,
                 monthly_limit=monthly_limit,
                 reset_day=1  # First day of month
             )
             
             db.session.add(quota)
-            db.session.commit()
+    
+    db.session.commit()
+    invalidate_dashboard_stats()
+    bump_list_version('users')
     
     flash('Registration request approved', 'success')
     return redirect(url_for('admin.registration_requests'))
 
+@admin_bp.route('/registration-requests/bulk-approve', methods=['POST'])
+@admin_required
+def bulk_approve_requests():
+    """Approve many registration requests with set-based statements."""
+    data = request.get_json()
+    
+    if not data or not isinstance(data.get('ids'), list):
+        return jsonify({'error': 'A list of request ids is required'}), 400
+    
+    # Pair each pending request with its user in one query
+    pairs = db.session.query(RegistrationRequest, User).join(
+        User, User.email == RegistrationRequest.email
+    ).filter(
+        RegistrationRequest.id.in_(data['ids']),
+        RegistrationRequest.status == 'pending'
+    ).all()
+    
+    if not pairs:
+        return jsonify({'message': 'No pending requests to approve', 'approved': 0}), 200
+    
+    now = datetime.utcnow()
+    request_ids = [reg_request.id for reg_request, _ in pairs]
+    new_tiers = {user.id: reg_request.requested_tier for reg_request, user in pairs}
+    
+    db.session.execute(
+        update(RegistrationRequest)
+        .where(RegistrationRequest.id.in_(request_ids))
+        .values(status='approved', processed_at=now, processed_by=current_user.id)
+    )
+    # Grant each user their requested tier (their role) in one UPDATE
+    db.session.execute(
+        update(User)
+        .where(User.id.in_(new_tiers))
+        .values(role=db.case(new_tiers, value=User.id))
+    )
+    
+    # Create quotas for users moving to an API tier that don't have one yet,
+    # with the same limits as single approval
+    existing = {user_id for (user_id,) in db.session.query(ApiQuota.user_id).filter(
+        ApiQuota.user_id.in_(new_tiers)
+    )}
+    quotas = []
+    for user_id, tier in new_tiers.items():
+        limits = _approval_quota(tier)
+        if user_id in existing or not limits:
+            continue
+        daily_limit, monthly_limit = limits
+        quotas.append({
+            'user_id': user_id,
+            'tier': tier,
+            'daily_limit': daily_limit,
+            'monthly_limit': monthly_limit,
+            'reset_day': 1  # First day of month
+        })
+    if quotas:
+        db.session.execute(insert(ApiQuota).values(quotas))
+    
+    db.session.commit()
+    invalidate_dashboard_stats()
+    bump_list_version('users')
+    
+    return jsonify({'message': 'Registration requests approved', 'approved': len(request_ids)}), 200
+
 @admin_bp.route('/registration-requests/<int:request_id>/reject', methods=['POST'])
 @admin_required
 def reject_request(request_id):
     """Reject registration request."""
-    reg_request = RegistrationRequest.query.get_or_404(request_id)
+    # Update request status only if it is still pending
+    result = db.session.execute(
+        update(RegistrationRequest)
+        .where(RegistrationRequest.id == request_id, RegistrationRequest.status == 'pending')
+        .values(status='rejected', processed_at=datetime.utcnow(), processed_by=current_user.id)
+    )
     
-    if reg_request.status != 'pending':
+    if result.rowcount == 0:
+        # Either the request doesn't exist or it was already processed
+        RegistrationRequest.query.get_or_404(request_id)
         flash('Request has already been processed', 'warning')
         return redirect(url_for('admin.registration_requests'))
     
-    # Update request status
-    reg_request.status = 'rejected'
-    reg_request.processed_at = datetime.utcnow()
-    reg_request.processed_by = current_user.id
-    
     db.session.commit()
+    invalidate_dashboard_stats()
     
     flash('Registration request rejected', 'success')
     return redirect(url_for('admin.registration_requests'))
@@ -239,15 +561,27 @@ def reject_request(request_id):
 @admin_required
 def devices():
     """Device management."""
-    # Get all devices with pagination
-    page = request.args.get('page', 1, type=int)
-    devices = Device.query.paginate(page=page, per_page=20)
-    
-    return render_template(
+    etag = _list_etag('devices')
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
+    # Get devices newest first, seeking past the previous page's last id;
+    # read-only list, so fetch plain rows of the rendered columns
+    after_id = request.args.get('after_id', type=int)
+    query = db.session.query(
+        Device.id, Device.user_id, Device.device_id, Device.device_type,
+        Device.os_type, Device.last_connected, Device.is_active
+    ).order_by(Device.id.desc())
+    if after_id:
+        query = query.filter(Device.id < after_id)
+    devices, next_cursor = _keyset_page(query, per_page=_list_page_size(20))
+    
+    return _with_etag(stream_template(
         'admin/devices.html',
         title='Device Management',
-        devices=devices
-    )
+        devices=devices,
+        next_cursor=next_cursor
+    ), etag)
 
 @admin_bp.route('/devices/<int:device_id>')
 @admin_required
@@ -256,67 +590,150 @@ def device_detail(device_id):
     device = Device.query.get_or_404(device_id)
     
     # Get device contributions
-    from src.models.device import DeviceContribution
     contributions = DeviceContribution.query.filter_by(
         device_id=device.id
     ).order_by(DeviceContribution.created_at.desc()).limit(20).all()
     
+    # Get lifetime totals in one aggregate query
+    total_count, total_duration, avg_quality = db.session.query(
+        db.func.count(DeviceContribution.id),
+        db.func.sum(DeviceContribution.duration),
+        db.func.avg(DeviceContribution.result_quality)
+    ).filter(DeviceContribution.device_id == device.id).one()
+    
     return render_template(
         'admin/device_detail.html',
         title=f'Device: {device.device_name}',
         device=device,
-        contributions=contributions
+        contributions=contributions,
+        totals={
+            'count': total_count,
+            'duration': total_duration or 0.0,
+            'avg_quality': avg_quality or 0.0
+        }
     )
 
 @admin_bp.route('/devices/<int:device_id>/toggle-active', methods=['POST'])
 @admin_required
 def toggle_device_active(device_id):
     """Toggle device active status."""
-    device = Device.query.get_or_404(device_id)
+    is_active = db.session.execute(
+        update(Device)
+        .where(Device.id == device_id)
+        .values(is_active=db.not_(Device.is_active))
+        .returning(Device.is_active)
+    ).scalar_one_or_none()
+    
+    if is_active is None:
+        abort(404)
     
-    device.is_active = not device.is_active
     db.session.commit()
+    invalidate_dashboard_stats()
+    bump_list_version('devices')
     
-    status = 'activated' if device.is_active else 'deactivated'
+    status = 'activated' if is_active else 'deactivated'
     flash(f'Device {status} successfully', 'success')
-    return redirect(url_for('admin.device_detail', device_id=device.id))
+    return redirect(url_for('admin.device_detail', device_id=device_id))
 
 @admin_bp.route('/system-metrics')
 @admin_required
 def system_metrics():
     """System metrics view."""
-    # Get metrics with pagination
-    page = request.args.get('page', 1, type=int)
-    metrics = SystemMetrics.query.order_by(
-        SystemMetrics.timestamp.desc()
-    ).paginate(page=page, per_page=24)  # 24 hours of hourly metrics
-    
-    return render_template(
+    # Get metrics newest first; id breaks ties between equal timestamps
+    after_id = request.args.get('after_id', type=int)
+    query = SystemMetrics.query.order_by(
+        SystemMetrics.timestamp.desc(),
+        SystemMetrics.id.desc()
+    )
+    if after_id:
+        last = SystemMetrics.query.get_or_404(after_id)
+        query = query.filter(db.or_(
+            SystemMetrics.timestamp < last.timestamp,
+            db.and_(SystemMetrics.timestamp == last.timestamp, SystemMetrics.id < last.id)
+        ))
+    metrics, next_cursor = _keyset_page(query, per_page=_list_page_size(24))  # 24 hours of hourly metrics
+    
+    return stream_template(
         'admin/system_metrics.html',
         title='System Metrics',
-        metrics=metrics
+        metrics=metrics,
+        next_cursor=next_cursor
     )
 
+@admin_bp.route('/system-metrics.json')
+@admin_required
+def system_metrics_json():
+    """System metrics time series for charts, newest first."""
+    before = request.args.get('before')
+    before_id = request.args.get('before_id', type=int)
+    limit = max(1, min(request.args.get('limit', 500, type=int), 1000))
+    
+    # Same (timestamp, id) keyset as system_metrics, so rows sharing the
+    # boundary timestamp are neither skipped nor repeated
+    query = SystemMetrics.query.order_by(SystemMetrics.timestamp.desc(), SystemMetrics.id.desc())
+    if before:
+        try:
+            before_ts = datetime.fromisoformat(before)
+        except ValueError:
+            return jsonify({'error': 'Invalid before timestamp'}), 400
+        
+        if before_id is None:
+            query = query.filter(SystemMetrics.timestamp < before_ts)
+        else:
+            query = query.filter(db.or_(
+                SystemMetrics.timestamp < before_ts,
+                db.and_(SystemMetrics.timestamp == before_ts, SystemMetrics.id < before_id)
+            ))
+    
+    rows = query.limit(limit).all()
+    last = rows[-1] if len(rows) == limit else None
+    
+    return jsonify({
+        'metrics': [row.to_dict() for row in rows],
+        'next_before': last.timestamp if last else None,
+        'next_before_id': last.id if last else None
+    }), 200
+
 @admin_bp.route('/alerts')
 @admin_required
 def alerts():
     """Weather alert management."""
-    # Get all active alerts
-    active_alerts = WeatherAlert.query.filter(
-        WeatherAlert.end_time > datetime.utcnow()
-    ).order_by(WeatherAlert.created_at.desc()).all()
+    etag = _list_etag('alerts')
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
+    now = datetime.utcnow()
+    columns = (
+        WeatherAlert.id, WeatherAlert.location_id, WeatherAlert.alert_type,
+        WeatherAlert.severity, WeatherAlert.title, WeatherAlert.description,
+        WeatherAlert.start_time,
+        WeatherAlert.end_time, WeatherAlert.issuing_authority,
+        WeatherAlert.created_at
+    )
+    
+    # All active alerts plus the 20 most recently expired in one round trip;
+    # read-only, so plain rows suffice
+    active = select(*columns, literal('active').label('bucket')).where(
+        WeatherAlert.end_time > now
+    )
+    expired = select(*columns, literal('expired').label('bucket')).where(
+        WeatherAlert.end_time <= now
+    ).order_by(WeatherAlert.end_time.desc()).limit(20).subquery()
+    rows = db.session.execute(union_all(active, select(expired))).all()
+    
+    active_alerts = [row for row in rows if row.bucket == 'active']
+    active_alerts.sort(key=lambda row: row.created_at, reverse=True)
     
     # Get recent expired alerts
-    expired_alerts = WeatherAlert.query.filter(
-        WeatherAlert.end_time <= datetime.utcnow()
-    ).order_by(WeatherAlert.end_time.desc()).limit(20).all()
+    expired_alerts = [row for row in rows if row.bucket == 'expired']
+    expired_alerts.sort(key=lambda row: row.end_time, reverse=True)
     
-    return render_template(
+    return _with_etag(make_response(render_template(
         'admin/alerts.html',
         title='Weather Alerts',
         active_alerts=active_alerts,
         expired_alerts=expired_alerts
-    )
+    )), etag)
 
 @admin_bp.route('/alerts/create', methods=['GET', 'POST'])
 @admin_required
@@ -359,12 +776,13 @@ def create_alert():
         
         db.session.add(alert)
         db.session.commit()
+        bump_list_version('alerts')
         
         flash('Alert created successfully', 'success')
         return redirect(url_for('admin.alerts'))
     
     # Get all locations for the form
-    locations = Location.query.all()
+    locations = _location_choices()
     
     return render_template(
         'admin/create_alert.html',
@@ -372,14 +790,61 @@ def create_alert():
         locations=locations
     )
 
+@admin_bp.route('/alerts/bulk-create', methods=['POST'])
+@admin_required
+def bulk_create_alerts():
+    """Create many weather alerts from a JSON array in one transaction."""
+    data = request.get_json()
+    
+    if not data or not isinstance(data, list):
+        return jsonify({'error': 'A list of alerts is required'}), 400
+    
+    required_fields = ['location_id', 'alert_type', 'severity', 'title',
+                      'description', 'start_time', 'end_time']
+    
+    rows = []
+    for index, item in enumerate(data):
+        if not isinstance(item, dict):
+            return jsonify({'error': f'Alert {index}: must be an object'}), 400
+        
+        for field in required_fields:
+            if not item.get(field):
+                return jsonify({'error': f'Alert {index}: missing required field: {field}'}), 400
+        
+        try:
+            rows.append({
+                'location_id': int(item['location_id']),
+                'alert_type': item['alert_type'],
+                'severity': item['severity'],
+                'title': item['title'],
+                'description': item['description'],
+                'start_time': datetime.fromisoformat(item['start_time']),
+                'end_time': datetime.fromisoformat(item['end_time']),
+                'issuing_authority': item.get('issuing_authority') or 'Toronto AI Weather'
+            })
+        except (ValueError, TypeError):
+            return jsonify({'error': f'Alert {index}: invalid input data'}), 400
+    
+    # Core executemany batches rows into multi-row INSERTs; commit once
+    for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+        db.session.execute(insert(WeatherAlert), rows[start:start + BULK_INSERT_CHUNK_SIZE])
+    db.session.commit()
+    bump_list_version('alerts')
+    
+    return jsonify({'message': 'Alerts created successfully', 'created': len(rows)}), 201
+
 @admin_bp.route('/alerts/<int:alert_id>/delete', methods=['POST'])
 @admin_required
 def delete_alert(alert_id):
     """Delete a weather alert."""
-    alert = WeatherAlert.query.get_or_404(alert_id)
+    result = db.session.execute(
+        delete(WeatherAlert).where(WeatherAlert.id == alert_id)
+    )
+    if result.rowcount == 0:
+        abort(404)
     
-    db.session.delete(alert)
     db.session.commit()
+    bump_list_version('alerts')
     
     flash('Alert deleted successfully', 'success')
     return redirect(url_for('admin.alerts'))
@@ -2,21 +2,193 @@
 API routes for Toronto AI Weather web application.
 """
 
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify, g, make_response, current_app, abort
 from flask_login import login_required, current_user
 from functools import wraps
+from collections import namedtuple
+from types import SimpleNamespace
+from typing import Any, Optional
+from uuid import UUID
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select, update, delete, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from datetime import datetime
+import hashlib
 
-from src.main import db
+from src.main import db, cache, csrf, ReadSession
 from src.models.user import User, UserTier
-from src.models.weather import Location, WeatherData, Forecast, WeatherAlert
-from src.models.device import Device, DeviceContribution, ComputationTask, SystemMetrics
-from src.models.api import ApiKey, ApiUsage, ApiQuota
+from src.models.weather import Location, WeatherData, Forecast, WeatherAlert, PredictionAccuracy, quantize_coordinate
+from src.models.device import Device, DeviceContribution, ComputationTask
+from src.models.api import ApiKey, ApiQuota, ApiUsage
 from src.utils.weather import get_current_weather, get_forecast
-from src.utils.distributed import register_device_task, submit_computation_task
+from src.utils.api_usage import record_usage
+from src.utils.rate_limit import redis_client, consume_quota
+from src.utils.distributed import register_device_task, submit_computation_task, get_latest_metrics
 
 api_bp = Blueprint('api', __name__)
 
+API_KEY_CACHE_TTL = 60
+WEATHER_CACHE_TTL = 60
+ACCURACY_CACHE_TTL = 300
+
+# Alert fields returned by the API, selected as plain columns
+ALERT_COLUMNS = (
+    WeatherAlert.id,
+    WeatherAlert.alert_type,
+    WeatherAlert.severity,
+    WeatherAlert.title,
+    WeatherAlert.description,
+    WeatherAlert.start_time,
+    WeatherAlert.end_time,
+    WeatherAlert.issuing_authority
+)
+
+# Access level per tier, checked by require_tier
+TIER_LEVELS = {
+    UserTier.CIVILIAN: 0,
+    UserTier.WEATHER_AGENCY: 1,
+    UserTier.NEWS: 1,
+    UserTier.GOVERNMENT: 2,
+    UserTier.MILITARY: 3,
+    UserTier.ADMIN: 4
+}
+
+# Request payloads
+class DeviceRegistration(BaseModel):
+    device_uuid: UUID
+    device_name: str
+    device_type: str
+    os_name: str
+    os_version: str
+    browser_name: Optional[str] = None
+    browser_version: Optional[str] = None
+    cpu_cores: int
+    cpu_speed: Optional[float] = None
+    memory_total: float
+    gpu_name: Optional[str] = None
+    gpu_memory: Optional[float] = None
+    network_type: Optional[str] = None
+    network_speed: Optional[float] = None
+    max_resource_allocation: float
+
+class Heartbeat(BaseModel):
+    device_uuid: UUID
+    available_resources: Optional[Any] = None
+
+class TaskSubmission(BaseModel):
+    task_type: str
+    priority: int
+    data: Any
+    required_resources: Any
+
+class TaskResult(BaseModel):
+    task_uuid: UUID
+    device_uuid: UUID
+    status: str
+    result: Any
+    cpu_usage: float = 0.0
+    memory_usage: float = 0.0
+    gpu_usage: float = 0.0
+    network_usage: float = 0.0
+    duration: float = 0.0
+    result_quality: float = 1.0
+
+def parse_payload(schema):
+    """
+    Validate the request's JSON body against a payload schema.
+    
+    Args:
+        schema: Pydantic model class
+    
+    Returns:
+        tuple: (data, error_response); data is a plain dict with coerced
+            values, error_response is set instead when validation fails
+    """
+    data = request.get_json(silent=True)
+    
+    if not data:
+        return None, (jsonify({'error': 'No input data provided'}), 400)
+    
+    try:
+        return schema.model_validate(data).model_dump(mode='json'), None
+    except ValidationError as e:
+        return None, (jsonify({
+            'error': 'Invalid input data',
+            'details': [
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}"
+                for err in e.errors()
+            ]
+        }), 400)
+
+class ApiKeyInfo(namedtuple('ApiKeyInfo', ['key_id', 'user_id', 'role', 'expires_at', 'is_active'])):
+    """Cached snapshot of an API key and its owner's role."""
+    
+    __slots__ = ()
+    
+    def is_valid(self):
+        """Check if the API key is valid."""
+        if not self.is_active:
+            return False
+        return not self.expires_at or datetime.utcnow() <= self.expires_at
+
+def _api_key_cache_key(key_hash):
+    """Cache key for an API key, so raw keys never reach the cache backend."""
+    return 'api:key:' + key_hash.hex()
+
+def lookup_api_key(api_key):
+    """
+    Look up an API key, serving repeat callers from the cache.
+    
+    Args:
+        api_key: Raw API key from the request
+    
+    Returns:
+        ApiKeyInfo: Key snapshot, or None if the key does not exist
+    """
+    key_hash = ApiKey.hash_key(api_key)
+    cache_key = _api_key_cache_key(key_hash)
+    info = cache.get(cache_key)
+    if info is not None:
+        return info
+    
+    row = ReadSession.execute(
+        select(ApiKey.id, ApiKey.user_id, User.role, ApiKey.expires_at, ApiKey.is_active)
+        .join(User, User.id == ApiKey.user_id)
+        .where(ApiKey.key_hash == key_hash)
+    ).first()
+    if row is None:
+        return None
+    
+    info = ApiKeyInfo(*row)
+    cache.set(cache_key, info, timeout=API_KEY_CACHE_TTL)
+    return info
+
+def invalidate_api_key(key_hash):
+    """Drop a cached API key lookup."""
+    cache.delete(_api_key_cache_key(key_hash))
+
+def lookup_quota_limits(user_id):
+    """
+    Get a user's daily and monthly API limits, serving repeat callers from the cache.
+    
+    Args:
+        user_id (int): User ID
+    
+    Returns:
+        tuple: (daily_limit, monthly_limit), 0 meaning unlimited
+    """
+    cache_key = f'api:quota:{user_id}'
+    limits = cache.get(cache_key)
+    if limits is not None:
+        return limits
+    
+    row = ReadSession.execute(
+        select(ApiQuota.daily_limit, ApiQuota.monthly_limit).where(ApiQuota.user_id == user_id)
+    ).first()
+    limits = (row.daily_limit or 0, row.monthly_limit or 0) if row else (0, 0)
+    cache.set(cache_key, limits, timeout=API_KEY_CACHE_TTL)
+    return limits
+
 def require_api_key(f):
     """Decorator to require API key for access."""
     @wraps(f)
@@ -26,7 +198,7 @@ def require_api_key(f):
         if not api_key:
             return jsonify({'error': 'API key is required'}), 401
         
-        key = ApiKey.query.filter_by(key=api_key).first()
+        key = lookup_api_key(api_key)
         
         if not key:
             return jsonify({'error': 'Invalid API key'}), 401
@@ -34,39 +206,83 @@ def require_api_key(f):
         if not key.is_valid():
             return jsonify({'error': 'API key is expired or inactive'}), 401
         
-        # Check quota
-        quota = ApiQuota.query.filter_by(user_id=key.user_id).first()
-        if quota and not quota.check_quota():
-            return jsonify({'error': 'API quota exceeded'}), 429
+        # Check and consume quota: Redis token buckets when available, else the ApiQuota row
+        if redis_client is not None:
+            daily_limit, monthly_limit = lookup_quota_limits(key.user_id)
+            if not consume_quota(key.user_id, daily_limit, monthly_limit):
+                return jsonify({'error': 'API quota exceeded'}), 429
+        else:
+            quota = ApiQuota.query.filter_by(user_id=key.user_id).first()
+            if quota and not quota.check_quota():
+                return jsonify({'error': 'API quota exceeded'}), 429
+            if quota:
+                quota.increment_usage()
         
-        # Store API key for later use
+        # Store API key for later use; handlers only need the owner's id and
+        # role, both already in the key lookup, so the User row is not loaded
         g.api_key = key
-        g.user = User.query.get(key.user_id)
+        g.user = SimpleNamespace(id=key.user_id, role=key.role)
         
-        # Update last used timestamp
-        key.update_last_used()
-        
-        # Log API usage
-        usage = ApiUsage(
-            api_key_id=key.id,
+        # Log API usage and last used timestamp; written in batches off the request path
+        record_usage(
+            api_key_id=key.key_id,
             endpoint=request.path,
             method=request.method,
             ip_address=request.remote_addr,
             user_agent=request.user_agent.string
         )
-        db.session.add(usage)
-        
-        # Increment quota usage if applicable
-        if quota:
-            quota.increment_usage()
-        
-        db.session.commit()
         
         return f(*args, **kwargs)
     return decorated_function
 
+def _request_coordinates():
+    """Lat/lon from the query string snapped to the grid, (None, None) if missing or invalid."""
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    
+    if latitude is None or longitude is None:
+        return None, None
+    return quantize_coordinate(latitude), quantize_coordinate(longitude)
+
+def _cache_arg(name):
+    """Request argument as used in a response cache key, with coordinates snapped to the grid."""
+    if name in ('lat', 'lon'):
+        value = request.args.get(name, type=float)
+        if value is not None:
+            return str(quantize_coordinate(value))
+    return request.args.get(name, '')
+
+def cache_json_response(*arg_names, timeout=WEATHER_CACHE_TTL):
+    """
+    Decorator to cache a view's successful JSON body keyed on request arguments.
+    
+    The serialized bytes are stored, so cache hits skip the query and the JSON encoding.
+    
+    Args:
+        *arg_names: Query string arguments that identify the response
+        timeout (int): Cache lifetime in seconds
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            cache_key = 'api:' + request.endpoint + ':' + ':'.join(
+                _cache_arg(name) for name in arg_names
+            )
+            body = cache.get(cache_key)
+            if body is not None:
+                return current_app.response_class(body, mimetype='application/json')
+            
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                cache.set(cache_key, response.get_data(), timeout=timeout)
+            return response
+        return decorated_function
+    return decorator
+
 def require_tier(tier_level):
     """Decorator to require specific user tier for access."""
+    required_level = TIER_LEVELS.get(tier_level, 0)
+    
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
@@ -79,55 +295,43 @@ def require_tier(tier_level):
             else:
                 return jsonify({'error': 'Authentication required'}), 401
             
-            # Check tier level
-            tier_levels = {
-                UserTier.CIVILIAN: 0,
-                UserTier.WEATHER_AGENCY: 1,
-                UserTier.NEWS: 1,
-                UserTier.GOVERNMENT: 2,
-                UserTier.MILITARY: 3,
-                UserTier.ADMIN: 4
-            }
-            
-            user_level = tier_levels.get(user.tier, 0)
-            required_level = tier_levels.get(tier_level, 0)
-            
-            if user_level < required_level:
+            # Check tier level; a user's tier is their role
+            if TIER_LEVELS.get(user.role, 0) < required_level:
                 return jsonify({'error': 'Insufficient access level'}), 403
             
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
+def _can_access_api():
+    """Check the signed-in user's API access once per request."""
+    can_access = g.get('_can_access_api')
+    if can_access is None:
+        can_access = g._can_access_api = current_user.can_access_api()
+    return can_access
+
 @api_bp.route('/weather/current')
 @require_api_key
+@cache_json_response('lat', 'lon')
 def current_weather():
     """Get current weather for a location."""
-    latitude = request.args.get('lat')
-    longitude = request.args.get('lon')
+    latitude, longitude = _request_coordinates()
     
-    if not latitude or not longitude:
-        return jsonify({'error': 'Latitude and longitude are required'}), 400
+    if latitude is None:
+        return jsonify({'error': 'Valid latitude and longitude are required'}), 400
     
-    try:
-        latitude = float(latitude)
-        longitude = float(longitude)
-    except ValueError:
-        return jsonify({'error': 'Invalid coordinates'}), 400
-    
-    # Get weather data
-    location = Location.query.filter_by(
-        latitude=latitude,
-        longitude=longitude
-    ).first()
+    # Get the latest reading for the grid cell in one indexed join
+    weather_data = ReadSession.execute(
+        select(*WeatherData.__table__.columns).join(
+            Location, Location.id == WeatherData.location_id
+        ).where(
+            Location.lat_q == latitude,
+            Location.lon_q == longitude
+        ).order_by(WeatherData.timestamp.desc()).limit(1)
+    ).mappings().first()
     
-    if location:
-        weather_data = WeatherData.query.filter_by(
-            location_id=location.id
-        ).order_by(WeatherData.timestamp.desc()).first()
-        
-        if weather_data:
-            return jsonify(weather_data.to_dict()), 200
+    if weather_data:
+        return jsonify(dict(weather_data)), 200
     
     # If no data in database, fetch from weather service
     weather_data = get_current_weather(latitude, longitude)
@@ -139,39 +343,30 @@ def current_weather():
 
 @api_bp.route('/weather/forecast')
 @require_api_key
+@cache_json_response('lat', 'lon', 'hours')
 def forecast():
     """Get weather forecast for a location."""
-    latitude = request.args.get('lat')
-    longitude = request.args.get('lon')
-    hours = request.args.get('hours', 24)
-    
-    if not latitude or not longitude:
-        return jsonify({'error': 'Latitude and longitude are required'}), 400
-    
-    try:
-        latitude = float(latitude)
-        longitude = float(longitude)
-        hours = int(hours)
-    except ValueError:
-        return jsonify({'error': 'Invalid parameters'}), 400
-    
-    # Get forecast data
-    location = Location.query.filter_by(
-        latitude=latitude,
-        longitude=longitude
-    ).first()
-    
-    if location:
-        forecast_data = Forecast.query.filter_by(
-            location_id=location.id
-        ).filter(
+    latitude, longitude = _request_coordinates()
+    hours = request.args.get('hours', 24, type=int)
+    
+    if latitude is None:
+        return jsonify({'error': 'Valid latitude and longitude are required'}), 400
+    
+    # Get forecast data for the grid cell in one indexed join
+    forecast_data = ReadSession.execute(
+        select(*Forecast.__table__.columns).join(
+            Location, Location.id == Forecast.location_id
+        ).where(
+            Location.lat_q == latitude,
+            Location.lon_q == longitude,
             Forecast.forecast_timestamp > datetime.utcnow()
         ).order_by(
             Forecast.forecast_timestamp
-        ).limit(hours).all()
-        
-        if forecast_data:
-            return jsonify([f.to_dict() for f in forecast_data]), 200
+        ).limit(hours)
+    ).mappings().all()
+    
+    if forecast_data:
+        return jsonify([dict(f) for f in forecast_data]), 200
     
     # If no data in database, fetch from weather service
     forecast_data = get_forecast(latitude, longitude, hours=hours)
@@ -183,101 +378,67 @@ def forecast():
 
 @api_bp.route('/weather/alerts')
 @require_api_key
+@cache_json_response('lat', 'lon')
 def alerts():
     """Get active weather alerts."""
-    latitude = request.args.get('lat')
-    longitude = request.args.get('lon')
-    
-    if latitude and longitude:
-        try:
-            latitude = float(latitude)
-            longitude = float(longitude)
-        except ValueError:
-            return jsonify({'error': 'Invalid coordinates'}), 400
+    if request.args.get('lat') and request.args.get('lon'):
+        latitude, longitude = _request_coordinates()
         
-        # Get alerts for specific location
-        location = Location.query.filter_by(
-            latitude=latitude,
-            longitude=longitude
-        ).first()
+        if latitude is None:
+            return jsonify({'error': 'Invalid coordinates'}), 400
         
-        if location:
-            alerts = WeatherAlert.query.filter_by(
-                location_id=location.id
-            ).filter(
+        # Get alerts for locations in the grid cell
+        alerts = ReadSession.execute(
+            select(*ALERT_COLUMNS).join(
+                Location, Location.id == WeatherAlert.location_id
+            ).where(
+                Location.lat_q == latitude,
+                Location.lon_q == longitude,
                 WeatherAlert.end_time > datetime.utcnow()
-            ).all()
-            
-            return jsonify([{
-                'id': a.id,
-                'alert_type': a.alert_type,
-                'severity': a.severity,
-                'title': a.title,
-                'description': a.description,
-                'start_time': a.start_time.isoformat(),
-                'end_time': a.end_time.isoformat(),
-                'issuing_authority': a.issuing_authority
-            } for a in alerts]), 200
-        else:
-            return jsonify([]), 200
+            )
+        ).mappings()
     else:
         # Get all active alerts
-        alerts = WeatherAlert.query.filter(
-            WeatherAlert.end_time > datetime.utcnow()
-        ).all()
-        
-        return jsonify([{
-            'id': a.id,
-            'location_id': a.location_id,
-            'alert_type': a.alert_type,
-            'severity': a.severity,
-            'title': a.title,
-            'description': a.description,
-            'start_time': a.start_time.isoformat(),
-            'end_time': a.end_time.isoformat(),
-            'issuing_authority': a.issuing_authority
-        } for a in alerts]), 200
+        alerts = ReadSession.execute(
+            select(WeatherAlert.location_id, *ALERT_COLUMNS).where(
+                WeatherAlert.end_time > datetime.utcnow()
+            )
+        ).mappings()
+    
+    return jsonify([dict(alert) for alert in alerts]), 200
 
 @api_bp.route('/system/metrics')
 @require_api_key
 @require_tier(UserTier.WEATHER_AGENCY)
 def system_metrics():
     """Get system metrics."""
-    metrics = SystemMetrics.query.order_by(
-        SystemMetrics.timestamp.desc()
-    ).first()
+    metrics = get_latest_metrics()
     
     if metrics:
-        return jsonify(metrics.to_dict()), 200
+        return jsonify(metrics), 200
     else:
         return jsonify({'error': 'Metrics not available'}), 404
 
 @api_bp.route('/system/accuracy')
 @require_api_key
+@cache_json_response(timeout=ACCURACY_CACHE_TTL)
 def accuracy():
     """Get prediction accuracy metrics."""
-    from src.models.weather import PredictionAccuracy
-    
-    # Get overall system accuracy
-    overall_accuracy = db.session.query(
-        db.func.avg(PredictionAccuracy.overall_accuracy)
-    ).scalar() or 0.0
-    
-    # Get accuracy by prediction type
-    temperature_accuracy = db.session.query(
-        db.func.avg(1.0 - PredictionAccuracy.temperature_error)
-    ).scalar() or 0.0
-    
-    humidity_accuracy = db.session.query(
-        db.func.avg(1.0 - PredictionAccuracy.humidity_error)
-    ).scalar() or 0.0
-    
-    precipitation_accuracy = db.session.query(
-        db.func.avg(1.0 - PredictionAccuracy.precipitation_error)
-    ).scalar() or 0.0
+    # Get overall and per-type accuracy in a single pass over the table
+    averages = ReadSession.execute(
+        select(
+            db.func.avg(PredictionAccuracy.overall_accuracy),
+            db.func.avg(1.0 - PredictionAccuracy.temperature_error),
+            db.func.avg(1.0 - PredictionAccuracy.humidity_error),
+            db.func.avg(1.0 - PredictionAccuracy.precipitation_error)
+        )
+    ).one()
+    overall_accuracy, temperature_accuracy, humidity_accuracy, precipitation_accuracy = (
+        value or 0.0 for value in averages
+    )
     
     # Get accuracy trend over time
-    accuracy_trend = db.session.query(
+    accuracy_trend = ReadSession.query(
         db.func.date(PredictionAccuracy.created_at),
         db.func.avg(PredictionAccuracy.overall_accuracy)
     ).group_by(
@@ -292,50 +453,73 @@ def accuracy():
         'humidity_accuracy': humidity_accuracy,
         'precipitation_accuracy': precipitation_accuracy,
         'accuracy_trend': [{
-            'date': date.isoformat(),
+            'date': date,
             'accuracy': float(accuracy)
         } for date, accuracy in accuracy_trend]
     }), 200
 
+def _device_columns(data):
+    """
+    Map a validated registration payload onto Device columns.
+    
+    The payload's UUID is the device_id. Device has no columns for the
+    hardware and network details, so those are not stored.
+    """
+    return {
+        'device_id': data['device_uuid'],
+        'device_type': data['device_type'],
+        'os_type': data['os_name'],
+        'browser_type': data.get('browser_name'),
+        'ip_address': request.remote_addr,
+        'is_active': True,
+        'last_connected': datetime.utcnow()
+    }
+
 @api_bp.route('/device/register', methods=['POST'])
 @require_api_key
 def register_device():
     """Register a device for distributed computation."""
-    data = request.get_json()
-    
-    if not data:
-        return jsonify({'error': 'No input data provided'}), 400
-    
-    required_fields = ['device_uuid', 'device_name', 'device_type', 'os_name', 
-                      'os_version', 'cpu_cores', 'memory_total', 'max_resource_allocation']
-    
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
+    data, error = parse_payload(DeviceRegistration)
+    
+    if error:
+        return error
+    
+    values = _device_columns(data)
+    
+    if db.engine.dialect.name == 'postgresql':
+        # Insert or update in one statement, without a race between workers
+        # registering the same device; xmax is 0 only for a freshly inserted row
+        device_id, created = db.session.execute(
+            pg_insert(Device).values(user_id=g.user.id, **values).on_conflict_do_update(
+                index_elements=[Device.device_id],
+                set_=values
+            ).returning(Device.id, literal_column('xmax = 0'))
+        ).one()
+        db.session.commit()
+        
+        if not created:
+            return jsonify({
+                'message': 'Device updated successfully',
+                'device_id': device_id
+            }), 200
+        
+        # Register device with task system
+        register_device_task(db.session.get(Device, device_id))
+        
+        return jsonify({
+            'message': 'Device registered successfully',
+            'device_id': device_id
+        }), 201
     
     # Check if device already exists
     existing_device = Device.query.filter_by(
-        device_uuid=data['device_uuid']
+        device_id=values['device_id']
     ).first()
     
     if existing_device:
         # Update existing device
-        existing_device.device_name = data['device_name']
-        existing_device.device_type = data['device_type']
-        existing_device.os_name = data['os_name']
-        existing_device.os_version = data['os_version']
-        existing_device.browser_name = data.get('browser_name')
-        existing_device.browser_version = data.get('browser_version')
-        existing_device.cpu_cores = data['cpu_cores']
-        existing_device.cpu_speed = data.get('cpu_speed')
-        existing_device.memory_total = data['memory_total']
-        existing_device.gpu_name = data.get('gpu_name')
-        existing_device.gpu_memory = data.get('gpu_memory')
-        existing_device.network_type = data.get('network_type')
-        existing_device.network_speed = data.get('network_speed')
-        existing_device.max_resource_allocation = data['max_resource_allocation']
-        existing_device.is_active = True
-        existing_device.last_seen = datetime.utcnow()
+        for column, value in values.items():
+            setattr(existing_device, column, value)
         
         db.session.commit()
         
@@ -345,24 +529,7 @@ def register_device():
         }), 200
     
     # Create new device
-    device = Device(
-        user_id=g.user.id,
-        device_uuid=data['device_uuid'],
-        device_name=data['device_name'],
-        device_type=data['device_type'],
-        os_name=data['os_name'],
-        os_version=data['os_version'],
-        browser_name=data.get('browser_name'),
-        browser_version=data.get('browser_version'),
-        cpu_cores=data['cpu_cores'],
-        cpu_speed=data.get('cpu_speed'),
-        memory_total=data['memory_total'],
-        gpu_name=data.get('gpu_name'),
-        gpu_memory=data.get('gpu_memory'),
-        network_type=data.get('network_type'),
-        network_speed=data.get('network_speed'),
-        max_resource_allocation=data['max_resource_allocation']
-    )
+    device = Device(user_id=g.user.id, **values)
     
     db.session.add(device)
     db.session.commit()
@@ -379,44 +546,55 @@ def register_device():
 @require_api_key
 def device_heartbeat():
     """Update device heartbeat."""
-    data = request.get_json()
-    
-    if not data or 'device_uuid' not in data:
-        return jsonify({'error': 'Device UUID is required'}), 400
-    
-    device = Device.query.filter_by(
-        device_uuid=data['device_uuid']
-    ).first()
-    
-    if not device:
+    data, error = parse_payload(Heartbeat)
+    
+    if error:
+        return error
+    
+    # Find the device and its pending tasks in one query; the outer join
+    # yields a single all-NULL task row for a device with nothing assigned
+    rows = db.session.execute(
+        select(
+            Device.id.label('device_id'),
+            ComputationTask.task_uuid,
+            ComputationTask.task_type,
+            ComputationTask.priority,
+            ComputationTask.data
+        ).outerjoin(
+            ComputationTask,
+            (ComputationTask.assigned_to == Device.id) & (ComputationTask.status == 'assigned')
+        ).where(Device.device_id == data['device_uuid'])
+    ).mappings().all()
+    
+    if not rows:
         return jsonify({'error': 'Device not found'}), 404
     
     # Update device status
-    device.is_active = True
-    device.last_seen = datetime.utcnow()
+    db.session.execute(
+        update(Device).where(Device.id == rows[0]['device_id']).values(
+            is_active=True,
+            last_connected=datetime.utcnow()
+        )
+    )
     
     # Update resource availability if provided
-    if 'available_resources' in data:
+    if data['available_resources'] is not None:
         resources = data['available_resources']
         # This would be stored in a separate table in a real implementation
     
     db.session.commit()
     
-    # Check for pending tasks
-    tasks = ComputationTask.query.filter_by(
-        assigned_to=device.id,
-        status='assigned'
-    ).all()
+    tasks = [{
+        'task_uuid': row['task_uuid'],
+        'task_type': row['task_type'],
+        'priority': row['priority'],
+        'data': row['data']
+    } for row in rows if row['task_uuid'] is not None]
     
     return jsonify({
         'message': 'Heartbeat received',
         'pending_tasks': len(tasks),
-        'tasks': [{
-            'task_uuid': task.task_uuid,
-            'task_type': task.task_type,
-            'priority': task.priority,
-            'data': task.data
-        } for task in tasks]
+        'tasks': tasks
     }), 200
 
 @api_bp.route('/task/submit', methods=['POST'])
@@ -424,16 +602,10 @@ def device_heartbeat():
 @require_tier(UserTier.WEATHER_AGENCY)
 def submit_task():
     """Submit a computation task."""
-    data = request.get_json()
-    
-    if not data:
-        return jsonify({'error': 'No input data provided'}), 400
+    data, error = parse_payload(TaskSubmission)
     
-    required_fields = ['task_type', 'priority', 'data', 'required_resources']
-    
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
+    if error:
+        return error
     
     # Submit task to distributed computation system
     task = submit_computation_task(
@@ -453,16 +625,10 @@ def submit_task():
 @require_api_key
 def submit_task_result():
     """Submit a task result."""
-    data = request.get_json()
-    
-    if not data:
-        return jsonify({'error': 'No input data provided'}), 400
-    
-    required_fields = ['task_uuid', 'device_uuid', 'status', 'result']
+    data, error = parse_payload(TaskResult)
     
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
+    if error:
+        return error
     
     # Find the task
     task = ComputationTask.query.filter_by(
@@ -474,7 +640,7 @@ def submit_task_result():
     
     # Find the device
     device = Device.query.filter_by(
-        device_uuid=data['device_uuid']
+        device_id=data['device_uuid']
     ).first()
     
     if not device:
@@ -512,27 +678,43 @@ def submit_task_result():
 @login_required
 def list_api_keys():
     """List user's API keys."""
-    if not current_user.can_access_api():
+    if not _can_access_api():
         return jsonify({'error': 'You do not have API access'}), 403
     
-    keys = ApiKey.query.filter_by(user_id=current_user.id).all()
+    keys = ApiKey.query.filter_by(user_id=current_user.id).order_by(ApiKey.id).all()
     
-    return jsonify([{
-        'id': key.id,
-        'name': key.name,
-        'key': key.key,
-        'description': key.description,
-        'is_active': key.is_active,
-        'expires_at': key.expires_at.isoformat() if key.expires_at else None,
-        'created_at': key.created_at.isoformat(),
-        'last_used': key.last_used.isoformat() if key.last_used else None
-    } for key in keys]), 200
+    # Fingerprint the listed fields so polling clients get a 304 instead of
+    # the same body again
+    etag = hashlib.blake2b(repr([
+        (key.id, key.name, key.description, key.is_active, key.expires_at, key.last_used)
+        for key in keys
+    ]).encode(), digest_size=8).hexdigest()
+    
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify([{
+            'id': key.id,
+            'name': key.name,
+            'key_prefix': key.key_prefix,
+            'description': key.description,
+            'is_active': key.is_active,
+            'expires_at': key.expires_at,
+            'created_at': key.created_at,
+            'last_used': key.last_used
+        } for key in keys])
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @api_bp.route('/keys', methods=['POST'])
 @login_required
 def create_api_key():
     """Create a new API key."""
-    if not current_user.can_access_api():
+    csrf.protect()
+    
+    if not _can_access_api():
         return jsonify({'error': 'You do not have API access'}), 403
     
     data = request.get_json()
@@ -553,23 +735,44 @@ def create_api_key():
     return jsonify({
         'id': key.id,
         'name': key.name,
-        'key': key.key,
+        'key': key.raw_key,
+        'key_prefix': key.key_prefix,
         'description': key.description,
         'is_active': key.is_active,
-        'expires_at': key.expires_at.isoformat() if key.expires_at else None,
-        'created_at': key.created_at.isoformat()
+        'expires_at': key.expires_at,
+        'created_at': key.created_at
     }), 201
 
 @api_bp.route('/keys/<int:key_id>', methods=['DELETE'])
 @login_required
 def delete_api_key(key_id):
     """Delete an API key."""
-    key = ApiKey.query.filter_by(
-        id=key_id,
-        user_id=current_user.id
-    ).first_or_404()
+    csrf.protect()
+    
+    # Delete by statement rather than loading the key and its usage rows;
+    # usage history is kept, detached from the key as the ORM cascade did
+    owned_key = select(ApiKey.id).where(
+        ApiKey.id == key_id,
+        ApiKey.user_id == current_user.id
+    ).scalar_subquery()
+    
+    db.session.execute(
+        update(ApiUsage).where(ApiUsage.api_key_id == owned_key).values(api_key_id=None)
+    )
+    deleted = db.session.execute(
+        delete(ApiKey).where(
+            ApiKey.id == key_id,
+            ApiKey.user_id == current_user.id
+        ).returning(ApiKey.id, ApiKey.key_hash)
+    ).first()
+    
+    if deleted is None:
+        db.session.rollback()
+        abort(404)
     
-    db.session.delete(key)
     db.session.commit()
+    # Keys that were never hashed were never cached either
+    if deleted.key_hash is not None:
+        invalidate_api_key(deleted.key_hash)
     
     return jsonify({'message': 'API key deleted successfully'}), 200
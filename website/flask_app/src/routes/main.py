@@ -9,15 +9,23 @@ from flask_login import login_required, current_user
 import json
 import datetime
 import random
+import hashlib
 
 # Import pure Python utilities
 from src.utils.pure_weather import get_current_weather, get_forecast, get_historical_data
-from src.utils.pure_visualization import generate_chart_data, generate_map_data
 from src.utils.distributed import register_device, get_device_stats, assign_task
+from src.utils.http_cache import static_page, stream_page
+from src.utils.chart_cache import DEFAULT_CENTER, DASHBOARD_CHARTS, MAP_LAYERS, get_cached_json
 
 main_bp = Blueprint('main', __name__)
 
+def _map_cache_key():
+    """Cache key for the global map, which only varies with the session's map center."""
+    map_center = json.dumps(session.get('map_center'), sort_keys=True)
+    return 'view/global_map/' + hashlib.md5(map_center.encode()).hexdigest()
+
 @main_bp.route('/')
+@static_page()
 def index():
     """Render the homepage."""
     return render_template('index.html')
@@ -27,7 +35,7 @@ def index():
 def dashboard():
     """Render the user dashboard."""
     # Get user's location (default to Toronto if not set)
-    user_location = session.get('user_location', {'latitude': 43.6532, 'longitude': -79.3832})
+    user_location = session.get('user_location', DEFAULT_CENTER)
     
     # Get current weather for user's location
     current_weather = get_current_weather(user_location['latitude'], user_location['longitude'])
@@ -38,38 +46,37 @@ def dashboard():
     # Get device stats if user has registered devices
     device_stats = get_device_stats(current_user.id) if current_user.is_authenticated else None
     
-    # Generate chart data
-    temperature_chart = generate_chart_data('temperature_forecast', user_location)
-    precipitation_chart = generate_chart_data('precipitation_forecast', user_location)
-    system_metrics = generate_chart_data('system_metrics')
+    # Chart data is precomputed for the default center and cached per location otherwise
+    temperature_chart, precipitation_chart, system_metrics = get_cached_json(
+        'chart', DASHBOARD_CHARTS, user_location
+    )
     
-    return render_template(
+    return stream_page(
         'dashboard.html',
         current_weather=current_weather,
         forecast=forecast,
         device_stats=device_stats,
-        temperature_chart=json.dumps(temperature_chart),
-        precipitation_chart=json.dumps(precipitation_chart),
-        system_metrics=json.dumps(system_metrics),
+        temperature_chart=temperature_chart,
+        precipitation_chart=precipitation_chart,
+        system_metrics=system_metrics,
         user_location=user_location
     )
 
 @main_bp.route('/global-map')
+@static_page(key_prefix=_map_cache_key)
 def global_map():
     """Render the global weather map."""
     # Get map center (default to Toronto if not set)
-    map_center = session.get('map_center', {'latitude': 43.6532, 'longitude': -79.3832})
+    map_center = session.get('map_center', DEFAULT_CENTER)
     
-    # Generate map data
-    temperature_map = generate_map_data('temperature', map_center)
-    precipitation_map = generate_map_data('precipitation', map_center)
-    wind_map = generate_map_data('wind', map_center)
+    # Map data is precomputed for the default center and cached per location otherwise
+    temperature_map, precipitation_map, wind_map = get_cached_json('map', MAP_LAYERS, map_center)
     
     return render_template(
         'global_map.html',
-        temperature_map=json.dumps(temperature_map),
-        precipitation_map=json.dumps(precipitation_map),
-        wind_map=json.dumps(wind_map),
+        temperature_map=temperature_map,
+        precipitation_map=precipitation_map,
+        wind_map=wind_map,
         map_center=map_center
     )
 
@@ -133,11 +140,13 @@ def submit_task_result():
     return jsonify({'success': False, 'error': 'Invalid task result data'})
 
 @main_bp.route('/about')
+@static_page()
 def about():
     """Render the about page."""
     return render_template('about.html')
 
 @main_bp.route('/contact')
+@static_page()
 def contact():
     """Render the contact page."""
     return render_template('contact.html')
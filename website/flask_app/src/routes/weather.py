@@ -2,19 +2,122 @@
 Weather routes for Toronto AI Weather web application.
 """
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
+from sqlalchemy import select
 
-from src.main import db
+from src.main import db, cache
 from src.models.user import User, SavedLocation
 from src.models.weather import Location, WeatherData, Forecast, WeatherAlert, PredictionAccuracy
 from src.utils.weather import get_current_weather, get_forecast, get_historical_weather
+from src.utils.http_cache import static_page, stream_page
+from src.utils.query import strict_query
+from src.utils.json_provider import dumps_bytes
 from src.utils.visualization import generate_weather_chart, generate_forecast_chart
 
 weather_bp = Blueprint('weather', __name__)
 
+LOCATION_ID_CACHE_TTL = 300
+CURRENT_WEATHER_CACHE_TTL = 60
+FORECAST_CACHE_TTL = 300
+FORECAST_BATCH_SIZE = 100  # rows per fetch when streaming forecast results
+SAVED_LOCATIONS_CACHE_TTL = 120
+HISTORICAL_CHART_CACHE_TTL = 86400  # a past day's chart never changes
+
+def _json_response(body):
+    """Wrap an already serialized JSON body in a response."""
+    return current_app.response_class(body, mimetype='application/json')
+
+def _get_location_id(latitude, longitude):
+    """
+    Get the ID of the stored location at the given coordinates.
+    
+    Only the primary key is fetched, and found IDs are cached; misses are
+    not, since the weather service creates the location on first use.
+    
+    Args:
+        latitude (float): Latitude coordinate
+        longitude (float): Longitude coordinate
+        
+    Returns:
+        int: Location ID or None if no location is stored there
+    """
+    cache_key = f'weather:location_id:{latitude}:{longitude}'
+    location_id = cache.get(cache_key)
+    if location_id is not None:
+        return location_id
+    
+    location_id = db.session.query(Location.id).filter_by(
+        latitude=latitude,
+        longitude=longitude
+    ).limit(1).scalar()
+    
+    if location_id is not None:
+        cache.set(cache_key, location_id, timeout=LOCATION_ID_CACHE_TTL)
+    return location_id
+
+def _saved_locations_cache_key(user_id):
+    """Cache key for a user's saved locations."""
+    return f'user:{user_id}:locs'
+
+def get_saved_locations(user_id):
+    """
+    Get a user's saved locations, cached for SAVED_LOCATIONS_CACHE_TTL.
+    
+    Locations are cached as plain dicts so pages a user moves between
+    share one query instead of each re-reading the same rows.
+    
+    Args:
+        user_id (int): User ID
+        
+    Returns:
+        list: Dicts with id, name, latitude, longitude and is_default
+    """
+    cache_key = _saved_locations_cache_key(user_id)
+    saved_locations = cache.get(cache_key)
+    if saved_locations is not None:
+        return saved_locations
+    
+    saved_locations = [dict(row) for row in db.session.execute(
+        select(
+            SavedLocation.id,
+            SavedLocation.name,
+            SavedLocation.latitude,
+            SavedLocation.longitude,
+            SavedLocation.is_default
+        ).where(
+            SavedLocation.user_id == user_id
+        ).order_by(SavedLocation.id)
+    ).mappings()]
+    
+    cache.set(cache_key, saved_locations, timeout=SAVED_LOCATIONS_CACHE_TTL)
+    return saved_locations
+
+def invalidate_saved_locations(user_id):
+    """
+    Drop a user's cached saved locations; call after adding, removing or
+    changing the default location.
+    
+    Args:
+        user_id (int): User ID
+    """
+    cache.delete(_saved_locations_cache_key(user_id))
+
+def get_default_location(user_id):
+    """
+    Get a user's default saved location from the cached list.
+    
+    Args:
+        user_id (int): User ID
+        
+    Returns:
+        dict: Default location or None if the user has not set one
+    """
+    return next((loc for loc in get_saved_locations(user_id) if loc['is_default']), None)
+
 @weather_bp.route('/global')
+@static_page()
 def global_map():
     """Render the global weather map."""
     # Get recent global weather data for visualization
@@ -24,6 +127,7 @@ def global_map():
     )
 
 @weather_bp.route('/regional')
+@static_page(query_string=True)
 def regional_map():
     """Render the regional weather map."""
     # Get region from query parameters or default to user's region
@@ -31,12 +135,7 @@ def regional_map():
     
     # If user is logged in and no region specified, use their default location
     if not region and current_user.is_authenticated:
-        default_location = SavedLocation.query.filter_by(
-            user_id=current_user.id,
-            is_default=True
-        ).first()
-        
-        if default_location:
+        if get_default_location(current_user.id):
             # Determine region from coordinates
             # This is a simplified approach - in production, would use a geocoding service
             region = "North America"  # Default fallback
@@ -57,15 +156,12 @@ def local_map():
     
     # If user is logged in and no coordinates specified, use their default location
     if (not latitude or not longitude) and current_user.is_authenticated:
-        default_location = SavedLocation.query.filter_by(
-            user_id=current_user.id,
-            is_default=True
-        ).first()
+        default_location = get_default_location(current_user.id)
         
         if default_location:
-            latitude = default_location.latitude
-            longitude = default_location.longitude
-            location_name = default_location.name
+            latitude = default_location['latitude']
+            longitude = default_location['longitude']
+            location_name = default_location['name']
     
     # If still no coordinates, use a default location
     if not latitude or not longitude:
@@ -81,21 +177,18 @@ def local_map():
         return redirect(url_for('weather.global_map'))
     
     # Get weather data for this location
-    location = Location.query.filter_by(
-        latitude=latitude,
-        longitude=longitude
-    ).first()
+    location_id = _get_location_id(latitude, longitude)
     
     weather_data = None
     forecast_data = None
     
-    if location:
-        weather_data = WeatherData.query.filter_by(
-            location_id=location.id
+    if location_id:
+        weather_data = strict_query(WeatherData).filter_by(
+            location_id=location_id
         ).order_by(WeatherData.timestamp.desc()).first()
         
-        forecast_data = Forecast.query.filter_by(
-            location_id=location.id
+        forecast_data = strict_query(Forecast).filter_by(
+            location_id=location_id
         ).order_by(Forecast.forecast_timestamp.asc()).limit(24).all()
     
     # If no data in database, fetch from weather service
@@ -115,7 +208,7 @@ def local_map():
     if forecast_data:
         forecast_chart = generate_forecast_chart(forecast_data)
     
-    return render_template(
+    return stream_page(
         'weather/local_map.html',
         title=f'{location_name} Weather',
         latitude=latitude,
@@ -130,15 +223,15 @@ def local_map():
 @weather_bp.route('/detail/<int:location_id>')
 def weather_detail(location_id):
     """Render detailed weather information for a location."""
-    location = Location.query.get_or_404(location_id)
+    location = strict_query(Location).get_or_404(location_id)
     
     # Get current weather
-    weather_data = WeatherData.query.filter_by(
+    weather_data = strict_query(WeatherData).filter_by(
         location_id=location.id
     ).order_by(WeatherData.timestamp.desc()).first()
     
     # Get forecast
-    forecast_data = Forecast.query.filter_by(
+    forecast_data = strict_query(Forecast).filter_by(
         location_id=location.id
     ).order_by(Forecast.forecast_timestamp.asc()).limit(24).all()
     
@@ -150,7 +243,7 @@ def weather_detail(location_id):
     )
     
     # Get any active alerts
-    alerts = WeatherAlert.query.filter_by(
+    alerts = strict_query(WeatherAlert).filter_by(
         location_id=location.id
     ).filter(
         WeatherAlert.end_time > datetime.utcnow()
@@ -168,9 +261,14 @@ def weather_detail(location_id):
         forecast_chart = generate_forecast_chart(forecast_data)
     
     if historical_data:
-        historical_chart = generate_weather_chart(historical_data, is_historical=True)
-    
-    return render_template(
+        # Rendering is the slow part and a past day's chart is fixed, so keep it for a day
+        cache_key = f"weather:hist_chart:{location.id}:{historical_data.timestamp:%Y-%m-%d}"
+        historical_chart = cache.get(cache_key)
+        if historical_chart is None:
+            historical_chart = generate_weather_chart(historical_data, is_historical=True)
+            cache.set(cache_key, historical_chart, timeout=HISTORICAL_CHART_CACHE_TTL)
+    
+    return stream_page(
         'weather/detail.html',
         title=f'{location.name} Weather Details',
         location=location,
@@ -186,23 +284,15 @@ def weather_detail(location_id):
 @weather_bp.route('/accuracy')
 def accuracy_stats():
     """Render prediction accuracy statistics."""
-    # Get overall system accuracy
-    overall_accuracy = db.session.query(
-        db.func.avg(PredictionAccuracy.overall_accuracy)
-    ).scalar() or 0.0
-    
-    # Get accuracy by prediction type
-    temperature_accuracy = db.session.query(
-        db.func.avg(1.0 - PredictionAccuracy.temperature_error)
-    ).scalar() or 0.0
-    
-    humidity_accuracy = db.session.query(
-        db.func.avg(1.0 - PredictionAccuracy.humidity_error)
-    ).scalar() or 0.0
-    
-    precipitation_accuracy = db.session.query(
-        db.func.avg(1.0 - PredictionAccuracy.precipitation_error)
-    ).scalar() or 0.0
+    # Get overall and per-type accuracy in a single pass over the table
+    overall_accuracy, temperature_accuracy, humidity_accuracy, precipitation_accuracy = (
+        value or 0.0 for value in db.session.query(
+            db.func.avg(PredictionAccuracy.overall_accuracy),
+            db.func.avg(1.0 - PredictionAccuracy.temperature_error),
+            db.func.avg(1.0 - PredictionAccuracy.humidity_error),
+            db.func.avg(1.0 - PredictionAccuracy.precipitation_error)
+        ).one()
+    )
     
     # Get accuracy trend over time
     accuracy_trend = db.session.query(
@@ -227,9 +317,12 @@ def accuracy_stats():
 @weather_bp.route('/alerts')
 def alerts():
     """Render active weather alerts."""
+    # One cutoff for both queries, so an alert cannot expire between them
+    now = datetime.utcnow()
+    
     # Get all active alerts
-    active_alerts = WeatherAlert.query.filter(
-        WeatherAlert.end_time > datetime.utcnow()
+    active_alerts = strict_query(WeatherAlert).filter(
+        WeatherAlert.end_time > now
     ).order_by(
         WeatherAlert.severity,
         WeatherAlert.start_time
@@ -238,30 +331,26 @@ def alerts():
     # If user is logged in, highlight alerts for their saved locations
     user_location_alerts = []
     if current_user.is_authenticated:
-        saved_locations = SavedLocation.query.filter_by(
-            user_id=current_user.id
-        ).all()
+        # Match saved locations to locations and their active alerts in one query
+        saved_location_alerts = db.session.query(SavedLocation, WeatherAlert).join(
+            Location, db.and_(
+                Location.latitude == SavedLocation.latitude,
+                Location.longitude == SavedLocation.longitude
+            )
+        ).join(
+            WeatherAlert, WeatherAlert.location_id == Location.id
+        ).filter(
+            SavedLocation.user_id == current_user.id,
+            WeatherAlert.end_time > now
+        ).order_by(SavedLocation.id).all()
         
-        for saved_location in saved_locations:
-            # Find the corresponding location in the database
-            location = Location.query.filter_by(
-                latitude=saved_location.latitude,
-                longitude=saved_location.longitude
-            ).first()
-            
-            if location:
-                # Get alerts for this location
-                location_alerts = WeatherAlert.query.filter_by(
-                    location_id=location.id
-                ).filter(
-                    WeatherAlert.end_time > datetime.utcnow()
-                ).all()
-                
-                if location_alerts:
-                    user_location_alerts.append({
-                        'saved_location': saved_location,
-                        'alerts': location_alerts
-                    })
+        groups = {}
+        for saved_location, alert in saved_location_alerts:
+            groups.setdefault(saved_location.id, {
+                'saved_location': saved_location,
+                'alerts': []
+            })['alerts'].append(alert)
+        user_location_alerts = list(groups.values())
     
     return render_template(
         'weather/alerts.html',
@@ -285,27 +374,31 @@ def api_current_weather():
     except ValueError:
         return jsonify({'error': 'Invalid coordinates'}), 400
     
+    # Serve nearby requests (~100 m) from one cached, already serialized body
+    cache_key = f'wx:cur:{latitude:.3f}:{longitude:.3f}'
+    body = cache.get(cache_key)
+    if body is not None:
+        return _json_response(body)
+    
     # Get weather data
-    location = Location.query.filter_by(
-        latitude=latitude,
-        longitude=longitude
-    ).first()
+    location_id = _get_location_id(latitude, longitude)
+    weather_data = None
     
-    if location:
+    if location_id:
         weather_data = WeatherData.query.filter_by(
-            location_id=location.id
+            location_id=location_id
         ).order_by(WeatherData.timestamp.desc()).first()
-        
-        if weather_data:
-            return jsonify(weather_data.to_dict()), 200
     
     # If no data in database, fetch from weather service
-    weather_data = get_current_weather(latitude, longitude)
+    if not weather_data:
+        weather_data = get_current_weather(latitude, longitude)
     
-    if weather_data:
-        return jsonify(weather_data.to_dict()), 200
-    else:
+    if not weather_data:
         return jsonify({'error': 'Weather data not available'}), 404
+    
+    body = dumps_bytes(weather_data.to_dict())
+    cache.set(cache_key, body, timeout=CURRENT_WEATHER_CACHE_TTL)
+    return _json_response(body)
 
 @weather_bp.route('/api/weather/forecast')
 def api_forecast():
@@ -324,28 +417,35 @@ def api_forecast():
     except ValueError:
         return jsonify({'error': 'Invalid parameters'}), 400
     
-    # Get forecast data
-    location = Location.query.filter_by(
-        latitude=latitude,
-        longitude=longitude
-    ).first()
-    
-    if location:
-        forecast_data = Forecast.query.filter_by(
-            location_id=location.id
-        ).filter(
-            Forecast.forecast_timestamp > datetime.utcnow()
-        ).order_by(
-            Forecast.forecast_timestamp
-        ).limit(hours).all()
-        
-        if forecast_data:
-            return jsonify([f.to_dict() for f in forecast_data]), 200
+    # Serve nearby requests (~100 m) from one cached, already serialized body
+    cache_key = f'wx:fc:{latitude:.3f}:{longitude:.3f}:{hours}'
+    body = cache.get(cache_key)
+    if body is not None:
+        return _json_response(body)
+    
+    # Get forecast data as plain rows; column names match Forecast.to_dict().
+    # Long forecasts are fetched through a server-side cursor in batches.
+    location_id = _get_location_id(latitude, longitude)
+    payload = None
+    
+    if location_id:
+        payload = [dict(row) for row in db.session.execute(
+            select(*Forecast.__table__.columns).where(
+                Forecast.location_id == location_id,
+                Forecast.forecast_timestamp > datetime.utcnow()
+            ).order_by(
+                Forecast.forecast_timestamp
+            ).limit(hours).execution_options(yield_per=FORECAST_BATCH_SIZE)
+        ).mappings()]
     
     # If no data in database, fetch from weather service
-    forecast_data = get_forecast(latitude, longitude, hours=hours)
+    if not payload:
+        forecast_data = get_forecast(latitude, longitude, hours=hours)
+        payload = [f.to_dict() for f in forecast_data] if forecast_data else None
     
-    if forecast_data:
-        return jsonify([f.to_dict() for f in forecast_data]), 200
-    else:
+    if not payload:
         return jsonify({'error': 'Forecast data not available'}), 404
+    
+    body = dumps_bytes(payload)
+    cache.set(cache_key, body, timeout=FORECAST_CACHE_TTL)
+    return _json_response(body)
@@ -4,21 +4,64 @@ Background tasks for Toronto AI Weather application.
 
 from celery import shared_task
 import logging
+from collections import defaultdict
 from datetime import datetime, timedelta
 
-from src.main import db
+import numpy as np
+from sqlalchemy import select, insert, delete
+
+from src.main import db, cache
 from src.models.device import SystemMetrics, ComputationTask, DeviceContribution
-from src.models.weather import WeatherData, Forecast, PredictionAccuracy
-from src.utils.distributed import update_system_metrics
+from src.models.weather import Location, WeatherData, Forecast, PredictionAccuracy
+from src.utils.distributed import update_system_metrics, cache_latest_metrics, process_task_results
 from src.utils.weather import get_current_weather, get_forecast
+from src.utils.chart_cache import precompute_default_charts
 
 logger = logging.getLogger(__name__)
 
-@shared_task
+CLEANUP_LOCK_KEY = 'tasks:cleanup_old_tasks:lock'
+CLEANUP_LOCK_TIMEOUT = 3600  # seconds; frees the lock if a worker dies mid-run
+CLEANUP_BATCH_SIZE = 10000
+STREAM_BATCH_SIZE = 1000  # rows per fetch when streaming large task reads
+
+def _delete_in_batches(model, cutoff):
+    """
+    Delete rows created before a cutoff, CLEANUP_BATCH_SIZE rows per transaction.
+    
+    Short transactions keep lock hold times and WAL bursts bounded when a
+    large backlog has built up.
+    
+    Args:
+        model: Model with id and created_at columns
+        cutoff (datetime): Rows created before this are deleted
+        
+    Returns:
+        int: Number of rows deleted
+    """
+    deleted = 0
+    while True:
+        batch = select(model.id).where(model.created_at < cutoff).limit(CLEANUP_BATCH_SIZE)
+        count = db.session.execute(
+            delete(model).where(model.id.in_(batch)).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        
+        deleted += count
+        if count < CLEANUP_BATCH_SIZE:
+            return deleted
+
+def _locations_with_weather():
+    """Fetch the coordinates of every location that has weather data in one query."""
+    return db.session.query(Location.latitude, Location.longitude).filter(
+        Location.id.in_(db.session.query(WeatherData.location_id).distinct())
+    ).all()
+
+@shared_task(rate_limit='12/m')
 def update_system_metrics_task():
     """Update system-wide metrics."""
     try:
         metrics = update_system_metrics()
+        cache_latest_metrics(metrics.to_dict())
         return {
             'status': 'success',
             'active_devices': metrics.active_devices,
@@ -36,22 +79,11 @@ def process_weather_data_task():
     """Process new weather data."""
     try:
         # Get locations that need updating
-        locations = db.session.query(
-            db.func.distinct(WeatherData.location_id)
-        ).all()
-        
-        location_ids = [loc[0] for loc in locations]
+        locations = _locations_with_weather()
         
         processed_count = 0
         
-        for location_id in location_ids:
-            # Get location
-            from src.models.weather import Location
-            location = Location.query.get(location_id)
-            
-            if not location:
-                continue
-            
+        for location in locations:
             # Get current weather
             weather = get_current_weather(location.latitude, location.longitude)
             
@@ -74,22 +106,11 @@ def update_predictions_task():
     """Update weather predictions."""
     try:
         # Get locations that need updating
-        locations = db.session.query(
-            db.func.distinct(WeatherData.location_id)
-        ).all()
-        
-        location_ids = [loc[0] for loc in locations]
+        locations = _locations_with_weather()
         
         updated_count = 0
         
-        for location_id in location_ids:
-            # Get location
-            from src.models.weather import Location
-            location = Location.query.get(location_id)
-            
-            if not location:
-                continue
-            
+        for location in locations:
             # Get forecast
             forecasts = get_forecast(location.latitude, location.longitude, hours=24)
             
@@ -110,32 +131,25 @@ def update_predictions_task():
 @shared_task
 def cleanup_old_tasks_task():
     """Clean up old tasks and contributions."""
+    # Only one cleanup at a time; an overlapping run is dropped, not queued
+    if not cache.add(CLEANUP_LOCK_KEY, True, timeout=CLEANUP_LOCK_TIMEOUT):
+        return {
+            'status': 'skipped',
+            'message': 'Cleanup already running'
+        }
+    
     try:
-        # Delete tasks older than 30 days
+        # Delete tasks and contributions older than 30 days in batches;
+        # contributions go first since they may reference tasks
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
         
-        old_tasks = ComputationTask.query.filter(
-            ComputationTask.created_at < thirty_days_ago
-        ).all()
-        
-        for task in old_tasks:
-            db.session.delete(task)
-        
-        # Delete contributions older than 30 days
-        old_contributions = DeviceContribution.query.filter(
-            DeviceContribution.created_at < thirty_days_ago
-        ).all()
-        
-        for contribution in old_contributions:
-            db.session.delete(contribution)
-        
-        # Commit changes
-        db.session.commit()
+        deleted_contributions = _delete_in_batches(DeviceContribution, thirty_days_ago)
+        deleted_tasks = _delete_in_batches(ComputationTask, thirty_days_ago)
         
         return {
             'status': 'success',
-            'deleted_tasks': len(old_tasks),
-            'deleted_contributions': len(old_contributions)
+            'deleted_tasks': deleted_tasks,
+            'deleted_contributions': deleted_contributions
         }
     except Exception as e:
         logger.error(f"Error cleaning up old tasks: {e}")
@@ -144,88 +158,172 @@ def cleanup_old_tasks_task():
             'status': 'error',
             'message': str(e)
         }
+    finally:
+        cache.delete(CLEANUP_LOCK_KEY)
+
+def _location_accuracy_sql(day_start, day_end):
+    """
+    Average temperature and condition accuracy per location, in the database.
+    
+    Forecasts are joined to the latest reading in their hour and
+    aggregated server-side, so only one row per location comes back.
+    
+    Args:
+        day_start (datetime): Start of the forecast creation window
+        day_end (datetime): End of the window (exclusive)
+        
+    Returns:
+        list: (location_id, temperature accuracy, condition accuracy) tuples
+    """
+    hour = db.func.date_trunc('hour', WeatherData.timestamp)
+    
+    # Latest reading per location and hour
+    actual = select(
+        WeatherData.location_id,
+        hour.label('hour'),
+        WeatherData.temperature,
+        WeatherData.weather_condition
+    ).where(
+        WeatherData.timestamp >= day_start,
+        WeatherData.timestamp < day_end
+    ).distinct(
+        WeatherData.location_id, hour
+    ).order_by(
+        WeatherData.location_id, hour, WeatherData.timestamp.desc()
+    ).subquery()
+    
+    # 10°C difference = 0% accuracy
+    return db.session.query(
+        Forecast.location_id,
+        db.func.avg(db.func.greatest(0, 1 - db.func.abs(Forecast.temperature - actual.c.temperature) / 10)),
+        db.func.avg(db.case((Forecast.weather_condition == actual.c.weather_condition, 1.0), else_=0.0))
+    ).join(
+        actual, db.and_(
+            actual.c.location_id == Forecast.location_id,
+            actual.c.hour == Forecast.forecast_timestamp
+        )
+    ).filter(
+        Forecast.prediction_timestamp >= day_start,
+        Forecast.prediction_timestamp < day_end
+    ).group_by(Forecast.location_id).all()
+
+def _location_accuracy_python(day_start, day_end):
+    """
+    Average temperature and condition accuracy per location, in Python.
+    
+    Fallback for databases without DISTINCT ON and date_trunc.
+    
+    Args:
+        day_start (datetime): Start of the forecast creation window
+        day_end (datetime): End of the window (exclusive)
+        
+    Returns:
+        list: (location_id, temperature accuracy, condition accuracy) tuples
+    """
+    # Fetch the window's forecasts and actuals in one query each, only the
+    # columns the comparison uses; rows are streamed in batches straight
+    # into the lookup structures rather than materialized as lists
+    forecasts = db.session.execute(
+        select(
+            Forecast.location_id,
+            Forecast.forecast_timestamp,
+            Forecast.temperature,
+            Forecast.weather_condition
+        ).where(
+            Forecast.prediction_timestamp >= day_start,
+            Forecast.prediction_timestamp < day_end
+        ).execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    
+    # Group forecasts by location
+    forecast_by_location = defaultdict(list)
+    
+    for forecast in forecasts:
+        forecast_by_location[forecast.location_id].append(forecast)
+    
+    actual_weather = db.session.execute(
+        select(
+            WeatherData.location_id,
+            WeatherData.timestamp,
+            WeatherData.temperature,
+            WeatherData.weather_condition
+        ).where(
+            WeatherData.timestamp >= day_start,
+            WeatherData.timestamp < day_end
+        ).order_by(WeatherData.timestamp).execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    
+    # Map (location, hour) to actual weather; readings arrive oldest first,
+    # so the latest in each hour wins, as in the SQL path
+    actual_by_time = {}
+    
+    for weather in actual_weather:
+        # Round to nearest hour
+        hour = weather.timestamp.replace(minute=0, second=0, microsecond=0)
+        actual_by_time[weather.location_id, hour] = weather
+    
+    # Calculate accuracy for each location
+    location_accuracy = []
+    
+    for location_id, location_forecasts in forecast_by_location.items():
+        # Pair each forecast with the actual weather for its hour
+        matched = [
+            (forecast, actual_by_time[location_id, forecast.forecast_timestamp])
+            for forecast in location_forecasts
+            if (location_id, forecast.forecast_timestamp) in actual_by_time
+        ]
+        
+        # Calculate overall accuracy over all pairs at once
+        if matched:
+            count = len(matched)
+            forecast_temps = np.fromiter((f.temperature for f, _ in matched), dtype=float, count=count)
+            actual_temps = np.fromiter((a.temperature for _, a in matched), dtype=float, count=count)
+            conditions_match = np.fromiter(
+                (f.weather_condition == a.weather_condition for f, a in matched), dtype=bool, count=count
+            )
+            
+            # 10°C difference = 0% accuracy
+            avg_temp_acc = float(np.clip(1 - np.abs(forecast_temps - actual_temps) / 10, 0, None).mean())
+            avg_condition_acc = float(conditions_match.mean())
+            
+            location_accuracy.append((location_id, avg_temp_acc, avg_condition_acc))
+    
+    return location_accuracy
 
 @shared_task
 def calculate_prediction_accuracy_task():
     """Calculate prediction accuracy."""
     try:
-        # Get forecasts from yesterday
+        # Yesterday's forecast window
         yesterday = datetime.utcnow() - timedelta(days=1)
+        day_start = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
+        day_end = day_start + timedelta(days=1)
         
-        forecasts = Forecast.query.filter(
-            Forecast.created_at >= yesterday.replace(hour=0, minute=0, second=0),
-            Forecast.created_at <= yesterday.replace(hour=23, minute=59, second=59)
-        ).all()
-        
-        # Group by location
-        forecast_by_location = {}
+        if db.engine.dialect.name == 'postgresql':
+            location_accuracy = _location_accuracy_sql(day_start, day_end)
+        else:
+            location_accuracy = _location_accuracy_python(day_start, day_end)
         
-        for forecast in forecasts:
-            if forecast.location_id not in forecast_by_location:
-                forecast_by_location[forecast.location_id] = []
-            
-            forecast_by_location[forecast.location_id].append(forecast)
-        
-        # Calculate accuracy for each location
+        # Calculate overall accuracy for each location
         accuracy_records = []
         
-        for location_id, location_forecasts in forecast_by_location.items():
-            # Get actual weather data
-            actual_weather = WeatherData.query.filter(
-                WeatherData.location_id == location_id,
-                WeatherData.timestamp >= yesterday.replace(hour=0, minute=0, second=0),
-                WeatherData.timestamp <= yesterday.replace(hour=23, minute=59, second=59)
-            ).all()
-            
-            # Create mapping of timestamp to actual weather
-            actual_by_time = {}
-            
-            for weather in actual_weather:
-                # Round to nearest hour
-                hour = weather.timestamp.replace(minute=0, second=0, microsecond=0)
-                actual_by_time[hour] = weather
-            
-            # Calculate accuracy for each forecast
-            temp_accuracy = []
-            condition_accuracy = []
+        for location_id, avg_temp_acc, avg_condition_acc in location_accuracy:
+            overall_acc = (avg_temp_acc * 0.7) + (avg_condition_acc * 0.3)
             
-            for forecast in location_forecasts:
-                # Find closest actual weather
-                forecast_time = forecast.forecast_timestamp
-                
-                if forecast_time in actual_by_time:
-                    actual = actual_by_time[forecast_time]
-                    
-                    # Calculate temperature accuracy
-                    temp_diff = abs(forecast.temperature - actual.temperature)
-                    temp_acc = max(0, 1 - (temp_diff / 10))  # 10°C difference = 0% accuracy
-                    temp_accuracy.append(temp_acc)
-                    
-                    # Calculate condition accuracy
-                    condition_acc = 1.0 if forecast.weather_condition == actual.weather_condition else 0.0
-                    condition_accuracy.append(condition_acc)
-            
-            # Calculate overall accuracy
-            if temp_accuracy and condition_accuracy:
-                avg_temp_acc = sum(temp_accuracy) / len(temp_accuracy)
-                avg_condition_acc = sum(condition_accuracy) / len(condition_accuracy)
-                
-                overall_acc = (avg_temp_acc * 0.7) + (avg_condition_acc * 0.3)
-                
-                # Create accuracy record
-                accuracy = PredictionAccuracy(
-                    location_id=location_id,
-                    date=yesterday.date(),
-                    temperature_accuracy=avg_temp_acc,
-                    condition_accuracy=avg_condition_acc,
-                    overall_accuracy=overall_acc
-                )
-                
-                db.session.add(accuracy)
-                accuracy_records.append(accuracy)
-        
-        # Commit changes
-        db.session.commit()
+            # Collect accuracy record, dated by the forecast day it scores;
+            # readers take 1 - temperature_error as the temperature accuracy
+            accuracy_records.append({
+                'location_id': location_id,
+                'created_at': day_start,
+                'temperature_error': 1 - avg_temp_acc,
+                'condition_matched': avg_condition_acc >= 0.5,
+                'overall_accuracy': overall_acc
+            })
+        
+        # Insert all records in one multi-row INSERT
+        if accuracy_records:
+            db.session.execute(insert(PredictionAccuracy), accuracy_records)
+            db.session.commit()
         
         return {
             'status': 'success',
@@ -239,11 +337,46 @@ def calculate_prediction_accuracy_task():
             'message': str(e)
         }
 
+@shared_task(name='src.tasks.precompute_dashboard_charts')
+def precompute_dashboard_charts_task():
+    """Precompute dashboard chart and map data for the default center."""
+    try:
+        cached_count = precompute_default_charts()
+        return {
+            'status': 'success',
+            'cached_entries': cached_count
+        }
+    except Exception as e:
+        logger.error(f"Error precomputing dashboard charts: {e}")
+        return {
+            'status': 'error',
+            'message': str(e)
+        }
+
+@shared_task
+def process_task_results_task(submissions):
+    """Apply a batch of computation task results in one transaction."""
+    try:
+        processed_count = process_task_results(submissions)
+        return {
+            'status': 'success',
+            'processed_results': processed_count
+        }
+    except Exception as e:
+        logger.error(f"Error processing task results: {e}")
+        db.session.rollback()
+        return {
+            'status': 'error',
+            'message': str(e)
+        }
+
 # Map task names to functions
 task_map = {
     'update_system_metrics': update_system_metrics_task,
     'process_weather_data': process_weather_data_task,
     'update_predictions': update_predictions_task,
     'cleanup_old_tasks': cleanup_old_tasks_task,
-    'calculate_prediction_accuracy': calculate_prediction_accuracy_task
+    'calculate_prediction_accuracy': calculate_prediction_accuracy_task,
+    'precompute_dashboard_charts': precompute_dashboard_charts_task,
+    'process_task_results': process_task_results_task
 }
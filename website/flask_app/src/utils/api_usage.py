@@ -0,0 +1,109 @@
+"""
+API usage logging for Toronto AI Weather web application.
+
+Usage rows and last-used timestamps are buffered in memory and written
+in batches by a background thread, so API requests do not each pay for
+a write transaction.
+"""
+
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from threading import Lock
+
+from flask import current_app
+from sqlalchemy import bindparam, insert, update
+
+from src.main import db
+from src.models.api import ApiKey, ApiUsage
+from src.utils.background import BackgroundWriter
+
+logger = logging.getLogger(__name__)
+
+MAX_BUFFERED_USAGE = 10000
+FLUSH_BATCH_SIZE = 500
+FLUSH_INTERVAL = 5  # seconds
+LAST_USED_RESOLUTION = timedelta(minutes=1)
+
+# Oldest entries are dropped once the buffer is full rather than blocking requests
+_usage_buffer = deque(maxlen=MAX_BUFFERED_USAGE)
+_pending_last_used = {}
+_last_used_recorded = {}
+_lock = Lock()
+
+def record_usage(api_key_id, endpoint, method, ip_address, user_agent):
+    """
+    Queue an API usage row and last-used update for the next flush.
+    
+    Args:
+        api_key_id (int): API key ID
+        endpoint (str): Request path
+        method (str): HTTP method
+        ip_address (str): Client address
+        user_agent (str): Client user agent
+    """
+    now = datetime.utcnow()
+    _usage_buffer.append({
+        'api_key_id': api_key_id,
+        'endpoint': endpoint,
+        'method': method,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+        'timestamp': now
+    })
+    
+    # Coalesce last_used to at most one write per key per minute
+    with _lock:
+        recorded = _last_used_recorded.get(api_key_id)
+        if recorded is None or now - recorded >= LAST_USED_RESOLUTION:
+            _last_used_recorded[api_key_id] = now
+            _pending_last_used[api_key_id] = now
+    
+    if not _writer.started:
+        _writer.start(current_app._get_current_object())
+    if len(_usage_buffer) >= FLUSH_BATCH_SIZE:
+        _writer.wake()
+
+def flush_usage(app):
+    """
+    Write all buffered usage rows and last-used timestamps.
+    
+    Args:
+        app: Flask application
+    """
+    with _lock:
+        last_used = [{'b_id': key_id, 'b_last_used': ts} for key_id, ts in _pending_last_used.items()]
+        _pending_last_used.clear()
+    
+    with app.app_context():
+        try:
+            while _usage_buffer:
+                batch = []
+                while _usage_buffer and len(batch) < FLUSH_BATCH_SIZE:
+                    batch.append(_usage_buffer.popleft())
+                db.session.execute(insert(ApiUsage), batch)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error flushing API usage: {e}")
+        
+        # Separate transaction, so a failed timestamp update never costs usage
+        # rows; a Core executemany skips keys deleted since they were used,
+        # where the ORM bulk update by primary key would raise
+        try:
+            if last_used:
+                db.session.execute(
+                    update(ApiKey.__table__)
+                    .where(ApiKey.__table__.c.id == bindparam('b_id'))
+                    .values(last_used=bindparam('b_last_used')),
+                    last_used
+                )
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error flushing API key last used: {e}")
+        finally:
+            db.session.remove()
+
+# Flushes the usage buffer every FLUSH_INTERVAL seconds or when a batch fills
+_writer = BackgroundWriter(flush_usage, FLUSH_INTERVAL)
@@ -0,0 +1,61 @@
+"""
+Background writers for Toronto AI Weather web application.
+
+Request handlers buffer writes in memory and a daemon thread per buffer
+flushes them in batches, so requests do not each pay for a transaction.
+"""
+
+import atexit
+from threading import Event, Lock, Thread
+
+class BackgroundWriter:
+    """
+    Daemon thread that calls a flush function periodically.
+    
+    The thread starts on first use, once per process. It flushes every
+    interval seconds, or sooner when woken, and a final flush runs at exit
+    so buffered writes are not lost on shutdown.
+    """
+    
+    def __init__(self, flush, interval):
+        """
+        Args:
+            flush: Function taking the Flask application that writes the buffer
+            interval (float): Seconds between flushes
+        """
+        self._flush = flush
+        self._interval = interval
+        self._wakeup = Event()
+        self._lock = Lock()
+        self._thread = None
+    
+    @property
+    def started(self):
+        """Whether the thread is running in this process."""
+        return self._thread is not None
+    
+    def start(self, app):
+        """
+        Start the thread if it is not running yet.
+        
+        Args:
+            app: Flask application the flushes run in
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = Thread(target=self._run, args=(app,), daemon=True)
+            self._thread.start()
+        
+        atexit.register(self._flush, app)
+    
+    def wake(self):
+        """Flush now instead of waiting for the interval, e.g. when a buffer fills."""
+        self._wakeup.set()
+    
+    def _run(self, app):
+        """Flush every interval, or as soon as woken."""
+        while True:
+            self._wakeup.wait(self._interval)
+            self._wakeup.clear()
+            self._flush(app)
@@ -0,0 +1,77 @@
+"""
+Cached chart and map data for Toronto AI Weather.
+
+Chart and map JSON for the default center is precomputed by a periodic
+Celery task, so the dashboard and global map usually render from a single
+cache round trip. Other locations are computed on demand and cached
+under their rounded coordinates.
+"""
+
+from src.main import cache
+from src.utils.json_provider import dumps_bytes
+from src.utils.pure_visualization import generate_chart_data, generate_map_data
+
+DEFAULT_CENTER = {'latitude': 43.6532, 'longitude': -79.3832}  # Toronto
+CHART_CACHE_TTL = 120  # seconds, twice the precompute interval
+
+DASHBOARD_CHARTS = ('temperature_forecast', 'precipitation_forecast', 'system_metrics')
+MAP_LAYERS = ('temperature', 'precipitation', 'wind')
+
+# Chart types that are the same for every location
+GLOBAL_CHARTS = {'system_metrics', 'prediction_accuracy', 'device_contribution'}
+
+_GENERATORS = {
+    'chart': generate_chart_data,
+    'map': generate_map_data,
+}
+
+def _cache_key(kind, data_type, location):
+    """Cache key for one chart or map layer at a location rounded to 2 decimals."""
+    if kind == 'chart' and data_type in GLOBAL_CHARTS:
+        return f'{kind}:{data_type}'
+    location = location or DEFAULT_CENTER
+    return f"{kind}:{data_type}:{location['latitude']:.2f}:{location['longitude']:.2f}"
+
+def _generate(kind, data_type, location):
+    """Generate one chart or map layer and store its JSON."""
+    if kind == 'chart' and data_type in GLOBAL_CHARTS:
+        data = _GENERATORS[kind](data_type)
+    else:
+        data = _GENERATORS[kind](data_type, location or DEFAULT_CENTER)
+    
+    data_json = dumps_bytes(data).decode()
+    cache.set(_cache_key(kind, data_type, location), data_json, timeout=CHART_CACHE_TTL)
+    return data_json
+
+def get_cached_json(kind, data_types, location=None):
+    """
+    Get JSON-encoded chart or map data, computing whatever is not cached.
+    
+    Args:
+        kind (str): 'chart' or 'map'
+        data_types (tuple): Chart types or map layers to fetch
+        location (dict): Location with latitude and longitude, default center if None
+    
+    Returns:
+        list: JSON strings in the order of data_types
+    """
+    keys = [_cache_key(kind, data_type, location) for data_type in data_types]
+    cached = cache.get_many(*keys)
+    
+    return [
+        data_json if data_json is not None else _generate(kind, data_type, location)
+        for data_type, data_json in zip(data_types, cached)
+    ]
+
+def precompute_default_charts():
+    """
+    Regenerate the dashboard charts and map layers for the default center.
+    
+    Returns:
+        int: Number of entries written
+    """
+    for data_type in DASHBOARD_CHARTS:
+        _generate('chart', data_type, DEFAULT_CENTER)
+    for data_type in MAP_LAYERS:
+        _generate('map', data_type, DEFAULT_CENTER)
+    return len(DASHBOARD_CHARTS) + len(MAP_LAYERS)
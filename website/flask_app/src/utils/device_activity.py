@@ -0,0 +1,83 @@
+"""
+Device activity tracking for Toronto AI Weather web application.
+
+Connection timestamps from devices polling for work are coalesced in
+memory and written in one bulk update by a background thread, so task
+assignment does not commit once per poll.
+"""
+
+import logging
+from datetime import datetime
+from threading import Lock
+
+from flask import current_app
+from sqlalchemy import bindparam, update
+
+from src.main import db
+from src.models.device import Device
+from src.utils.background import BackgroundWriter
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5  # seconds
+MAX_PENDING_CONNECTIONS = 1000
+
+# Latest connection time per device primary key
+_pending_connections = {}
+_lock = Lock()
+
+def record_connections(device_pks):
+    """
+    Queue a last-connected update for each device for the next flush.
+    
+    Args:
+        device_pks (list): Device primary keys
+    """
+    now = datetime.utcnow()
+    with _lock:
+        for device_pk in device_pks:
+            _pending_connections[device_pk] = now
+        pending = len(_pending_connections)
+    
+    if not _writer.started:
+        _writer.start(current_app._get_current_object())
+    if pending >= MAX_PENDING_CONNECTIONS:
+        _writer.wake()
+
+def flush_connections(app):
+    """
+    Write all pending last-connected timestamps in one bulk update.
+    
+    Args:
+        app: Flask application
+    """
+    with _lock:
+        connections = [
+            {'b_id': device_pk, 'b_last_connected': ts}
+            for device_pk, ts in _pending_connections.items()
+        ]
+        _pending_connections.clear()
+    
+    if not connections:
+        return
+    
+    with app.app_context():
+        try:
+            # Core executemany skips devices deleted since their heartbeat,
+            # where an ORM bulk update by primary key would fail the batch
+            table = Device.__table__
+            db.session.execute(
+                update(table)
+                .where(table.c.id == bindparam('b_id'))
+                .values(last_connected=bindparam('b_last_connected')),
+                connections
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error flushing device connections: {e}")
+        finally:
+            db.session.remove()
+
+# Flushes pending connections every FLUSH_INTERVAL seconds or when many are queued
+_writer = BackgroundWriter(flush_connections, FLUSH_INTERVAL)
@@ -9,10 +9,38 @@ import json
 import random
 import datetime
 import uuid
+from types import MappingProxyType
 from typing import Dict, List, Any, Optional, Tuple, Union
 
-from src.main import db
-from src.models.device import Device
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from src.main import db, cache
+from src.models.device import Device, SystemMetrics, DEVICE_IDENTITY, CONTRIBUTION_BASE_LEVELS
+from src.models.weather import PredictionAccuracy
+from src.utils.device_activity import record_connections
+
+LATEST_METRICS_CACHE_KEY = 'sysmetrics:latest'
+LATEST_METRICS_CACHE_TTL = 300  # seconds; refreshed every minute by the metrics task
+SYSTEM_STATS_CACHE_KEY = 'distributed:system_stats'
+SYSTEM_STATS_CACHE_TTL = 10  # seconds
+METRICS_ACCURACY_WINDOW = datetime.timedelta(days=1)
+
+# Choices for generated task parameters
+PROCESSING_TYPES = ('filtering', 'aggregation', 'normalization')
+REGIONS = ('north_america', 'europe', 'asia', 'africa', 'south_america', 'oceania')
+WEATHER_VARIABLES = ('temperature', 'precipitation', 'wind', 'pressure')
+SIMPLE_PREDICTION_TYPES = ('temperature', 'precipitation')
+
+# Task types based on device capabilities (read-only, shared by every call)
+TASK_TYPES = MappingProxyType({
+    'server': ('data_processing', 'model_training', 'prediction', 'anomaly_detection'),
+    'desktop': ('data_processing', 'prediction', 'anomaly_detection'),
+    'laptop': ('data_processing', 'prediction'),
+    'tablet': ('data_collection', 'simple_prediction'),
+    'mobile': ('data_collection',)
+})
+DEFAULT_TASK_TYPES = ('data_collection',)
 
 def register_device(user_id: int, device_type: str, os_type: str, 
                    browser_type: str, ip_address: str) -> str:
@@ -32,12 +60,33 @@ def register_device(user_id: int, device_type: str, os_type: str,
     # Generate unique device ID
     device_id = str(uuid.uuid4())
     
-    # Check if device already exists with this IP for this user
-    existing_device = Device.query.filter_by(
-        user_id=user_id,
-        ip_address=ip_address,
-        device_type=device_type,
-        browser_type=browser_type
+    if db.engine.dialect.name == 'postgresql':
+        # Insert or refresh in one statement against ix_device_identity, without
+        # a race between concurrent registrations; xmax is 0 only for a new row
+        registered_id, created = db.session.execute(
+            pg_insert(Device).values(
+                user_id=user_id,
+                device_id=device_id,
+                device_type=device_type,
+                os_type=os_type,
+                browser_type=browser_type,
+                ip_address=ip_address
+            ).on_conflict_do_update(
+                index_elements=DEVICE_IDENTITY,
+                set_={'last_connected': datetime.datetime.utcnow()}
+            ).returning(Device.device_id, literal_column('xmax = 0'))
+        ).one()
+        db.session.commit()
+        
+        if created:
+            invalidate_system_stats()
+        return registered_id
+    
+    # Check if device already exists with this IP for this user, treating
+    # missing values the same way the unique index does
+    identity = (user_id or 0, ip_address or '', device_type or '', browser_type or '')
+    existing_device = Device.query.filter(
+        *(expression == value for expression, value in zip(DEVICE_IDENTITY, identity))
     ).first()
     
     if existing_device:
@@ -58,9 +107,68 @@ def register_device(user_id: int, device_type: str, os_type: str,
     
     db.session.add(device)
     db.session.commit()
+    invalidate_system_stats()
     
     return device_id
 
+def update_system_metrics() -> SystemMetrics:
+    """
+    Record a snapshot of system-wide metrics.
+    
+    Returns:
+        The SystemMetrics row written
+    """
+    invalidate_system_stats()
+    stats = get_system_stats()
+    
+    average_accuracy = db.session.query(
+        db.func.avg(PredictionAccuracy.overall_accuracy)
+    ).filter(
+        PredictionAccuracy.created_at >= datetime.datetime.utcnow() - METRICS_ACCURACY_WINDOW
+    ).scalar()
+    
+    metrics = SystemMetrics(
+        active_devices=stats['active_devices'],
+        total_devices=stats['total_devices'],
+        total_computation_time=stats['total_computation_time'],
+        total_tasks_completed=stats['total_tasks_completed'],
+        average_performance=stats['average_performance'],
+        system_load=stats['active_devices'] / stats['total_devices'] if stats['total_devices'] else 0.0,
+        average_prediction_accuracy=float(average_accuracy or 0.0)
+    )
+    db.session.add(metrics)
+    db.session.commit()
+    
+    return metrics
+
+def cache_latest_metrics(metrics: Dict[str, Any]) -> None:
+    """
+    Store the newest system metrics so readers skip the latest-row query.
+    
+    Args:
+        metrics: SystemMetrics.to_dict() of the row just written
+    """
+    cache.set(LATEST_METRICS_CACHE_KEY, metrics, timeout=LATEST_METRICS_CACHE_TTL)
+
+def get_latest_metrics() -> Optional[Dict[str, Any]]:
+    """
+    Get the newest system metrics, from the cache when available.
+    
+    Returns:
+        Dict with system metrics, or None if none have been recorded
+    """
+    metrics = cache.get(LATEST_METRICS_CACHE_KEY)
+    if metrics is not None:
+        return metrics
+    
+    latest = SystemMetrics.query.order_by(SystemMetrics.timestamp.desc(), SystemMetrics.id.desc()).first()
+    if latest is None:
+        return None
+    
+    metrics = latest.to_dict()
+    cache_latest_metrics(metrics)
+    return metrics
+
 def get_device_stats(user_id: int) -> Dict[str, Any]:
     """
     Get statistics for a user's devices.
@@ -71,9 +179,20 @@ def get_device_stats(user_id: int) -> Dict[str, Any]:
     Returns:
         Dict with device statistics
     """
-    devices = Device.query.filter_by(user_id=user_id).all()
-    
-    if not devices:
+    # Aggregate in the database instead of loading every device row;
+    # contribution level mirrors Device.get_contribution_level()
+    device_count, total_computation_time, total_tasks_completed, average_performance, contribution_level = db.session.query(
+        db.func.count(Device.id),
+        db.func.sum(Device.total_computation_time),
+        db.func.sum(Device.total_tasks_completed),
+        db.func.avg(Device.performance_score),
+        db.func.sum(
+            db.case(CONTRIBUTION_BASE_LEVELS, value=Device.device_type, else_=1.0)
+            * Device.performance_score / 100
+        )
+    ).filter(Device.user_id == user_id).one()
+    
+    if not device_count:
         return {
             'device_count': 0,
             'total_computation_time': 0,
@@ -82,17 +201,12 @@ def get_device_stats(user_id: int) -> Dict[str, Any]:
             'contribution_level': 0.0
         }
     
-    total_computation_time = sum(d.total_computation_time for d in devices)
-    total_tasks_completed = sum(d.total_tasks_completed for d in devices)
-    average_performance = sum(d.performance_score for d in devices) / len(devices)
-    contribution_level = sum(d.get_contribution_level() for d in devices)
-    
     return {
-        'device_count': len(devices),
-        'total_computation_time': total_computation_time,
-        'total_tasks_completed': total_tasks_completed,
-        'average_performance': round(average_performance, 2),
-        'contribution_level': round(contribution_level, 2)
+        'device_count': device_count,
+        'total_computation_time': total_computation_time or 0,
+        'total_tasks_completed': total_tasks_completed or 0,
+        'average_performance': round(average_performance or 0.0, 2),
+        'contribution_level': round(contribution_level or 0.0, 2)
     }
 
 def assign_task(device_id: str) -> Dict[str, Any]:
@@ -105,30 +219,108 @@ def assign_task(device_id: str) -> Dict[str, Any]:
     Returns:
         Dict with task details
     """
-    # Get device
-    device = Device.query.filter_by(device_id=device_id).first()
+    return assign_tasks_bulk([device_id])[device_id]
+
+def assign_tasks_bulk(device_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Assign a computation task to each of several devices.
     
-    if not device:
-        return {
-            'task_id': None,
-            'error': 'Device not found'
-        }
+    Devices are fetched in one query; their connection times are queued
+    for the background writer rather than committed on every poll.
     
-    # Update device connection time
-    device.update_connection()
-    db.session.commit()
+    Args:
+        device_ids: Device IDs
+        
+    Returns:
+        Dict mapping each device ID to its task details
+    """
+    devices = db.session.query(
+        Device.id,
+        Device.device_id,
+        Device.device_type,
+        Device.performance_score
+    ).filter(Device.device_id.in_(device_ids)).all()
     
-    # Task types based on device capabilities
-    task_types = {
-        'server': ['data_processing', 'model_training', 'prediction', 'anomaly_detection'],
-        'desktop': ['data_processing', 'prediction', 'anomaly_detection'],
-        'laptop': ['data_processing', 'prediction'],
-        'tablet': ['data_collection', 'simple_prediction'],
-        'mobile': ['data_collection']
-    }
+    # Connection times are written behind, coalesced across polls
+    record_connections([device.id for device in devices])
     
+    # Deadline is shared by every task assigned in this batch
+    deadline = (datetime.datetime.now() + datetime.timedelta(minutes=5)).isoformat()
+    
+    tasks = {device_id: {'task_id': None, 'error': 'Device not found'} for device_id in device_ids}
+    for device in devices:
+        tasks[device.device_id] = _build_task(device, deadline)
+    
+    return tasks
+
+def _data_processing_params(difficulty: float) -> Dict[str, Any]:
+    """Parameters for a data processing task."""
+    return {
+        'data_points': int(100 + (900 * difficulty)),
+        'processing_type': random.choice(PROCESSING_TYPES),
+        'region': random.choice(REGIONS)
+    }
+
+def _model_training_params(difficulty: float) -> Dict[str, Any]:
+    """Parameters for a model training task."""
+    return {
+        'model_type': random.choice(WEATHER_VARIABLES),
+        'iterations': int(10 + (90 * difficulty)),
+        'learning_rate': 0.01 + (0.09 * random.random())
+    }
+
+def _prediction_params(difficulty: float) -> Dict[str, Any]:
+    """Parameters for a prediction task."""
+    return {
+        'prediction_type': random.choice(WEATHER_VARIABLES),
+        'location': {
+            'latitude': random.uniform(-90, 90),
+            'longitude': random.uniform(-180, 180)
+        },
+        'hours_ahead': random.randint(1, 72)
+    }
+
+def _anomaly_detection_params(difficulty: float) -> Dict[str, Any]:
+    """Parameters for an anomaly detection task."""
+    return {
+        'data_type': random.choice(WEATHER_VARIABLES),
+        'threshold': 0.7 + (0.2 * random.random()),
+        'window_size': random.randint(6, 24)
+    }
+
+def _simple_prediction_params(difficulty: float) -> Dict[str, Any]:
+    """Parameters for a simple prediction task."""
+    return {
+        'prediction_type': random.choice(SIMPLE_PREDICTION_TYPES),
+        'location': {
+            'latitude': random.uniform(-90, 90),
+            'longitude': random.uniform(-180, 180)
+        },
+        'hours_ahead': random.randint(1, 24)
+    }
+
+def _data_collection_params(difficulty: float) -> Dict[str, Any]:
+    """Parameters for a data collection task."""
+    return {
+        'data_type': random.choice(WEATHER_VARIABLES),
+        'frequency': random.randint(1, 10),
+        'duration': random.randint(5, 30)
+    }
+
+# Parameter builder per task type; unknown types collect data
+_PARAM_BUILDERS = {
+    'data_processing': _data_processing_params,
+    'model_training': _model_training_params,
+    'prediction': _prediction_params,
+    'anomaly_detection': _anomaly_detection_params,
+    'simple_prediction': _simple_prediction_params,
+    'data_collection': _data_collection_params
+}
+
+def _build_task(device, deadline: str) -> Dict[str, Any]:
+    """Generate a task suited to a device's type and performance."""
     # Get appropriate task types for this device
-    device_task_types = task_types.get(device.device_type, ['data_collection'])
+    device_task_types = TASK_TYPES.get(device.device_type, DEFAULT_TASK_TYPES)
     
     # Generate a task
     task_type = random.choice(device_task_types)
@@ -138,48 +330,7 @@ def assign_task(device_id: str) -> Dict[str, Any]:
     difficulty = min(1.0, device.performance_score / 100)
     
     # Generate task parameters based on type
-    if task_type == 'data_processing':
-        task_params = {
-            'data_points': int(100 + (900 * difficulty)),
-            'processing_type': random.choice(['filtering', 'aggregation', 'normalization']),
-            'region': random.choice(['north_america', 'europe', 'asia', 'africa', 'south_america', 'oceania'])
-        }
-    elif task_type == 'model_training':
-        task_params = {
-            'model_type': random.choice(['temperature', 'precipitation', 'wind', 'pressure']),
-            'iterations': int(10 + (90 * difficulty)),
-            'learning_rate': 0.01 + (0.09 * random.random())
-        }
-    elif task_type == 'prediction':
-        task_params = {
-            'prediction_type': random.choice(['temperature', 'precipitation', 'wind', 'pressure']),
-            'location': {
-                'latitude': random.uniform(-90, 90),
-                'longitude': random.uniform(-180, 180)
-            },
-            'hours_ahead': random.randint(1, 72)
-        }
-    elif task_type == 'anomaly_detection':
-        task_params = {
-            'data_type': random.choice(['temperature', 'precipitation', 'wind', 'pressure']),
-            'threshold': 0.7 + (0.2 * random.random()),
-            'window_size': random.randint(6, 24)
-        }
-    elif task_type == 'simple_prediction':
-        task_params = {
-            'prediction_type': random.choice(['temperature', 'precipitation']),
-            'location': {
-                'latitude': random.uniform(-90, 90),
-                'longitude': random.uniform(-180, 180)
-            },
-            'hours_ahead': random.randint(1, 24)
-        }
-    else:  # data_collection
-        task_params = {
-            'data_type': random.choice(['temperature', 'precipitation', 'wind', 'pressure']),
-            'frequency': random.randint(1, 10),
-            'duration': random.randint(5, 30)
-        }
+    task_params = _PARAM_BUILDERS.get(task_type, _data_collection_params)(difficulty)
     
     # Estimated completion time (in seconds)
     estimated_time = int(10 + (50 * difficulty))
@@ -189,7 +340,7 @@ def assign_task(device_id: str) -> Dict[str, Any]:
         'task_type': task_type,
         'parameters': task_params,
         'estimated_time': estimated_time,
-        'deadline': (datetime.datetime.now() + datetime.timedelta(minutes=5)).isoformat()
+        'deadline': deadline
     }
 
 def process_task_result(device_id: str, task_id: str, result: Dict[str, Any]) -> bool:
@@ -204,27 +355,59 @@ def process_task_result(device_id: str, task_id: str, result: Dict[str, Any]) ->
     Returns:
         Success flag
     """
-    # Get device
-    device = Device.query.filter_by(device_id=device_id).first()
-    
-    if not device:
-        return False
+    return process_task_results([{
+        'device_id': device_id,
+        'task_id': task_id,
+        'result': result
+    }]) == 1
+
+def process_task_results(submissions: List[Dict[str, Any]]) -> int:
+    """
+    Process a batch of computation task results.
     
-    # Update device stats
-    device.add_task()
+    Devices are loaded in one query and all updates committed together,
+    so a batch costs one transaction instead of one per result.
     
-    # Add computation time
-    if 'computation_time' in result:
-        device.add_computation_time(result['computation_time'])
+    Args:
+        submissions: Dicts with device_id, task_id and result
+        
+    Returns:
+        Number of results applied to a known device
+    """
+    device_ids = {submission['device_id'] for submission in submissions}
+    devices = {
+        device.device_id: device
+        for device in Device.query.filter(Device.device_id.in_(device_ids))
+    }
     
-    # Update performance score
-    if 'performance_score' in result:
-        device.update_performance_score(result['performance_score'])
+    processed = 0
+    for submission in submissions:
+        device = devices.get(submission['device_id'])
+        if not device:
+            continue
+        
+        result = submission['result']
+        
+        # Update device stats
+        device.add_task()
+        
+        # Add computation time
+        if 'computation_time' in result:
+            device.add_computation_time(result['computation_time'])
+        
+        # Update performance score
+        if 'performance_score' in result:
+            device.update_performance_score(result['performance_score'])
+        
+        processed += 1
     
-    db.session.commit()
+    if processed:
+        db.session.commit()
+        invalidate_system_stats()
     
-    return True
+    return processed
 
+@cache.cached(timeout=SYSTEM_STATS_CACHE_TTL, key_prefix=SYSTEM_STATS_CACHE_KEY)
 def get_system_stats() -> Dict[str, Any]:
     """
     Get overall system statistics.
@@ -232,29 +415,35 @@ def get_system_stats() -> Dict[str, Any]:
     Returns:
         Dict with system statistics
     """
-    # Count active devices (connected in the last hour)
-    one_hour_ago = datetime.datetime.now() - datetime.timedelta(hours=1)
-    active_devices = Device.query.filter(Device.last_connected >= one_hour_ago).count()
-    
-    # Total devices
-    total_devices = Device.query.count()
-    
-    # Total computation time
-    total_computation_time = db.session.query(db.func.sum(Device.total_computation_time)).scalar() or 0
+    # last_connected is stored as naive UTC, so compare against UTC, not local time
+    one_hour_ago = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
     
-    # Total tasks completed
-    total_tasks_completed = db.session.query(db.func.sum(Device.total_tasks_completed)).scalar() or 0
-    
-    # Average performance score
-    avg_performance = db.session.query(db.func.avg(Device.performance_score)).scalar() or 0.0
-    
-    # Device type distribution
+    # One pass over devices, grouped by type; totals are summed from the
+    # handful of groups (active devices are those connected in the last hour)
     device_types = db.session.query(
-        Device.device_type, 
-        db.func.count(Device.id)
+        Device.device_type,
+        db.func.count(Device.id),
+        db.func.count(db.case((Device.last_connected >= one_hour_ago, Device.id))),
+        db.func.sum(Device.total_computation_time),
+        db.func.sum(Device.total_tasks_completed),
+        db.func.sum(Device.performance_score),
+        db.func.count(Device.performance_score)
     ).group_by(Device.device_type).all()
     
-    device_distribution = {device_type: count for device_type, count in device_types}
+    device_distribution = {}
+    active_devices = total_devices = total_computation_time = total_tasks_completed = 0
+    performance_sum = performance_count = 0
+    
+    for device_type, count, active, computation_time, tasks_completed, performance, scored in device_types:
+        device_distribution[device_type] = count
+        total_devices += count
+        active_devices += active
+        total_computation_time += computation_time or 0
+        total_tasks_completed += tasks_completed or 0
+        performance_sum += performance or 0.0
+        performance_count += scored
+    
+    avg_performance = performance_sum / performance_count if performance_count else 0.0
     
     return {
         'active_devices': active_devices,
@@ -264,3 +453,7 @@ def get_system_stats() -> Dict[str, Any]:
         'average_performance': round(avg_performance, 2),
         'device_distribution': device_distribution
     }
+
+def invalidate_system_stats() -> None:
+    """Drop cached system statistics after a device registers or finishes a task."""
+    cache.delete(SYSTEM_STATS_CACHE_KEY)
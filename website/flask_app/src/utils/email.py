@@ -2,24 +2,127 @@
 Email utility functions for Toronto AI Weather web application.
 """
 
+import atexit
 import logging
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, local
 from flask import current_app, render_template
-from threading import Thread
 from flask_mail import Message, Mail
 
 logger = logging.getLogger(__name__)
 
+MAIL_WORKERS = 8
+MAX_QUEUED_EMAILS = 64
+MAX_EMAILS_PER_CONNECTION = 1000
+SMTP_IDLE_TIMEOUT = 60  # seconds
+
 # Initialize mail
 mail = Mail()
 
+# Emails are sent by a fixed pool of workers; once MAX_QUEUED_EMAILS are
+# pending, callers wait for a slot instead of piling up more work
+_mail_executor = ThreadPoolExecutor(max_workers=MAIL_WORKERS, thread_name_prefix='mail')
+_mail_slots = BoundedSemaphore(MAX_QUEUED_EMAILS)
+atexit.register(_mail_executor.shutdown, wait=True)
+
+# Each mail worker keeps its own SMTP session open between messages
+_smtp = local()
+
+def get_connection():
+    """
+    Get the calling worker's SMTP connection, opening a new one if needed.
+    
+    The connection is replaced after MAX_EMAILS_PER_CONNECTION messages or
+    when it has been idle for SMTP_IDLE_TIMEOUT seconds, since servers
+    drop idle sessions. Must be called inside an app context.
+    
+    Returns:
+        Connection: Open Flask-Mail connection
+    """
+    conn = getattr(_smtp, 'conn', None)
+    if conn is not None and (
+        _smtp.sent >= MAX_EMAILS_PER_CONNECTION
+        or time.monotonic() - _smtp.last_used > SMTP_IDLE_TIMEOUT
+    ):
+        _close_connection()
+        conn = None
+    
+    if conn is None:
+        conn = mail.connect()
+        conn.__enter__()
+        _smtp.conn = conn
+        _smtp.sent = 0
+        _smtp.last_used = time.monotonic()
+    
+    return conn
+
+def _close_connection(quit=True):
+    """Close the calling worker's SMTP connection, politely unless it is already dead."""
+    conn = getattr(_smtp, 'conn', None)
+    _smtp.conn = None
+    if conn is None or conn.host is None:
+        return
+    
+    try:
+        if quit:
+            conn.host.quit()
+        else:
+            conn.host.close()
+    except (smtplib.SMTPException, OSError):
+        pass
+
+def _send_message(msg):
+    """Send one message on the worker's connection, reconnecting once if the server hung up."""
+    try:
+        get_connection().send(msg)
+    except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException) as e:
+        if isinstance(e, smtplib.SMTPResponseException) and e.smtp_code != 421:
+            raise
+        _close_connection(quit=False)
+        get_connection().send(msg)
+    
+    _smtp.sent += 1
+    _smtp.last_used = time.monotonic()
+
+def _submit(fn, *args):
+    """Queue work on the mail pool, waiting for a slot if too much is pending."""
+    _mail_slots.acquire()
+    try:
+        future = _mail_executor.submit(fn, *args)
+    except Exception:
+        _mail_slots.release()
+        raise
+    future.add_done_callback(lambda _: _mail_slots.release())
+
+def _build_message(subject, recipients, text_body, html_body, sender=None):
+    """Build a multipart message, defaulting to the configured sender."""
+    msg = Message(subject, sender=sender or current_app.config['MAIL_DEFAULT_SENDER'], recipients=recipients)
+    msg.body = text_body
+    msg.html = html_body
+    return msg
+
 def send_async_email(app, msg):
     """Send email asynchronously."""
     with app.app_context():
         try:
-            mail.send(msg)
+            _send_message(msg)
         except Exception as e:
             logger.error(f"Error sending email: {e}")
 
+def send_bulk_async(app, messages):
+    """Send a batch of emails asynchronously over one SMTP session."""
+    with app.app_context():
+        sent = 0
+        for msg in messages:
+            try:
+                _send_message(msg)
+                sent += 1
+            except Exception as e:
+                logger.error(f"Error sending email to {msg.recipients}: {e}")
+        logger.info(f"Sent {sent} of {len(messages)} bulk emails")
+
 def send_email(subject, recipients, text_body, html_body, sender=None):
     """
     Send an email.
@@ -32,20 +135,29 @@ def send_email(subject, recipients, text_body, html_body, sender=None):
         sender (str): Sender email address
     """
     try:
-        app = current_app._get_current_object()
-        sender = sender or app.config['MAIL_DEFAULT_SENDER']
-        
-        msg = Message(subject, sender=sender, recipients=recipients)
-        msg.body = text_body
-        msg.html = html_body
-        
-        Thread(target=send_async_email, args=(app, msg)).start()
-        
+        msg = _build_message(subject, recipients, text_body, html_body, sender)
+        _submit(send_async_email, current_app._get_current_object(), msg)
         return True
     except Exception as e:
         logger.error(f"Error preparing email: {e}")
         return False
 
+def send_bulk(messages):
+    """
+    Send many emails over a single SMTP connection.
+    
+    Args:
+        messages (list): Message objects
+    """
+    try:
+        messages = list(messages)
+        if messages:
+            _submit(send_bulk_async, current_app._get_current_object(), messages)
+        return True
+    except Exception as e:
+        logger.error(f"Error preparing bulk email: {e}")
+        return False
+
 def send_verification_email(user):
     """
     Send email verification link.
@@ -213,6 +325,56 @@ def send_tier_upgrade_notification(user, tier):
         logger.error(f"Error sending tier upgrade notification: {e}")
         return False
 
+def _weather_alert_content(user, alert):
+    """Subject, plain text and HTML bodies of a weather alert email."""
+    subject = f"Weather Alert: {alert.title}"
+    
+    # Plain text email
+    text_body = f"""
+    Hello {user.username},
+    
+    A weather alert has been issued for one of your saved locations:
+    
+    Type: {alert.alert_type}
+    Severity: {alert.severity}
+    Title: {alert.title}
+    Description: {alert.description}
+    
+    Start Time: {alert.start_time}
+    End Time: {alert.end_time}
+    
+    Issued by: {alert.issuing_authority}
+    
+    Please take necessary precautions.
+    
+    Best regards,
+    The Toronto AI Weather Team
+    """
+    
+    # HTML email
+    html_body = f"""
+    <p>Hello {user.username},</p>
+    
+    <p>A weather alert has been issued for one of your saved locations:</p>
+    
+    <p><strong>Type:</strong> {alert.alert_type}<br>
+    <strong>Severity:</strong> {alert.severity}<br>
+    <strong>Title:</strong> {alert.title}<br>
+    <strong>Description:</strong> {alert.description}</p>
+    
+    <p><strong>Start Time:</strong> {alert.start_time}<br>
+    <strong>End Time:</strong> {alert.end_time}</p>
+    
+    <p><strong>Issued by:</strong> {alert.issuing_authority}</p>
+    
+    <p>Please take necessary precautions.</p>
+    
+    <p>Best regards,<br>
+    The Toronto AI Weather Team</p>
+    """
+    
+    return subject, text_body, html_body
+
 def send_weather_alert(user, alert):
     """
     Send weather alert notification.
@@ -222,51 +384,7 @@ def send_weather_alert(user, alert):
         alert: WeatherAlert object
     """
     try:
-        subject = f"Weather Alert: {alert.title}"
-        
-        # Plain text email
-        text_body = f"""
-        Hello {user.username},
-        
-        A weather alert has been issued for one of your saved locations:
-        
-        Type: {alert.alert_type}
-        Severity: {alert.severity}
-        Title: {alert.title}
-        Description: {alert.description}
-        
-        Start Time: {alert.start_time}
-        End Time: {alert.end_time}
-        
-        Issued by: {alert.issuing_authority}
-        
-        Please take necessary precautions.
-        
-        Best regards,
-        The Toronto AI Weather Team
-        """
-        
-        # HTML email
-        html_body = f"""
-        <p>Hello {user.username},</p>
-        
-        <p>A weather alert has been issued for one of your saved locations:</p>
-        
-        <p><strong>Type:</strong> {alert.alert_type}<br>
-        <strong>Severity:</strong> {alert.severity}<br>
-        <strong>Title:</strong> {alert.title}<br>
-        <strong>Description:</strong> {alert.description}</p>
-        
-        <p><strong>Start Time:</strong> {alert.start_time}<br>
-        <strong>End Time:</strong> {alert.end_time}</p>
-        
-        <p><strong>Issued by:</strong> {alert.issuing_authority}</p>
-        
-        <p>Please take necessary precautions.</p>
-        
-        <p>Best regards,<br>
-        The Toronto AI Weather Team</p>
-        """
+        subject, text_body, html_body = _weather_alert_content(user, alert)
         
         return send_email(
             subject=subject,
@@ -277,3 +395,22 @@ def send_weather_alert(user, alert):
     except Exception as e:
         logger.error(f"Error sending weather alert: {e}")
         return False
+
+def send_weather_alerts(users, alert):
+    """
+    Send a weather alert notification to many users over one SMTP connection.
+    
+    Args:
+        users (list): User objects
+        alert: WeatherAlert object
+    """
+    try:
+        messages = []
+        for user in users:
+            subject, text_body, html_body = _weather_alert_content(user, alert)
+            messages.append(_build_message(subject, [user.email], text_body, html_body))
+        
+        return send_bulk(messages)
+    except Exception as e:
+        logger.error(f"Error sending weather alerts: {e}")
+        return False
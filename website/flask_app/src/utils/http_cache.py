@@ -0,0 +1,78 @@
+"""
+HTTP caching utilities for Toronto AI Weather web application.
+"""
+
+from functools import wraps
+from flask import current_app, request, session, make_response, get_flashed_messages, stream_with_context
+from flask_login import current_user
+
+from src.main import cache
+
+STATIC_PAGE_TIMEOUT = 3600  # seconds a rendered page is kept server-side
+STREAM_BUFFER_SIZE = 5  # template events per chunk written to the client
+
+def is_personalized():
+    """
+    Check whether the current page may contain per-visitor content.
+    
+    Returns:
+        bool: True for signed-in users and for visitors with pending flash messages
+    """
+    return current_user.is_authenticated or '_flashes' in session
+
+def static_page(timeout=STATIC_PAGE_TIMEOUT, **cached_kwargs):
+    """
+    Decorator for pages that render the same for every anonymous visitor.
+    
+    Anonymous GETs are served from the server-side cache and sent with an
+    ETag. Browsers must revalidate before reusing a page, because the same
+    URL renders differently once the visitor signs in. A repeat visit is
+    answered with 304, and shared caches never store the page.
+    Personalized requests bypass all of it.
+    
+    Args:
+        timeout (int): Server-side cache lifetime in seconds
+        **cached_kwargs: Extra arguments for cache.cached (key_prefix, query_string)
+    """
+    def decorator(f):
+        cached_view = cache.cached(timeout=timeout, unless=is_personalized, **cached_kwargs)(f)
+        
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            response = make_response(cached_view(*args, **kwargs))
+            
+            if request.method == 'GET' and response.status_code == 200 and not is_personalized():
+                response.headers['Cache-Control'] = 'private, no-cache'
+                response.vary.add('Cookie')
+                response.add_etag()
+                response.make_conditional(request)
+            
+            return response
+        return decorated_function
+    return decorator
+
+def stream_page(template_name, **context):
+    """
+    Render a template as a streamed response.
+    
+    The response starts as soon as the first chunk is rendered instead of
+    after the whole page is built. Chunks are buffered so each write
+    carries several template events rather than one.
+    
+    Args:
+        template_name (str): Template to render
+        **context: Template variables
+    
+    Returns:
+        Response: Streaming text/html response
+    """
+    # The session cookie goes out with the headers, before the template runs,
+    # so flashed messages must be consumed now or they would be shown again
+    get_flashed_messages()
+    
+    template = current_app.jinja_env.get_or_select_template(template_name)
+    current_app.update_template_context(context)
+    stream = template.stream(context)
+    stream.enable_buffering(STREAM_BUFFER_SIZE)
+    
+    return current_app.response_class(stream_with_context(stream), mimetype='text/html')
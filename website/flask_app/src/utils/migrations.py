@@ -0,0 +1,227 @@
+"""
+Schema and data migrations for Toronto AI Weather web application.
+
+db.create_all() creates missing tables but never changes existing ones,
+so databases created before a model gained a column, index or constraint
+are brought up to date here. Every migration checks whether it still has
+work to do, so running them on each start costs a few catalog queries.
+"""
+
+import logging
+
+from sqlalchemy import bindparam, delete, inspect, select, text, update
+
+from src.main import db
+from src.models.api import ApiKey
+from src.models.device import Device
+from src.models.weather import (Location, WeatherData, Forecast, WeatherAlert, PredictionAccuracy,
+                                quantize_coordinate)
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+MIGRATION_LOCK_ID = 580917  # PostgreSQL advisory lock shared by all app processes
+
+def add_missing_columns(conn, model, *names):
+    """
+    Add model columns the existing table lacks, as nullable columns.
+    
+    Args:
+        conn: Connection inside the migration transaction
+        model: Model class
+        *names: Column names to check
+    
+    Returns:
+        list: Names of the columns added
+    """
+    table = model.__table__
+    existing = {column['name'] for column in inspect(conn).get_columns(table.name)}
+    
+    added = []
+    for name in names:
+        if name in existing:
+            continue
+        column_type = table.c[name].type.compile(dialect=conn.dialect)
+        conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{name}" {column_type}'))
+        added.append(name)
+    return added
+
+def index_names(conn, table_name):
+    """
+    Names of all indexes on a table, read from the catalog.
+    
+    The SQLite inspector leaves out expression indexes such as
+    ix_device_identity, so SQLite and PostgreSQL are asked directly.
+    
+    Returns:
+        set: Index names
+    """
+    if conn.dialect.name == 'sqlite':
+        query = text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table")
+    elif conn.dialect.name == 'postgresql':
+        query = text(
+            'SELECT indexname FROM pg_indexes '
+            'WHERE schemaname = current_schema() AND tablename = :table'
+        )
+    else:
+        return {index['name'] for index in inspect(conn).get_indexes(table_name)}
+    return set(conn.execute(query, {'table': table_name}).scalars())
+
+def create_missing_indexes(conn, model):
+    """Create the model's declared indexes that the existing table lacks."""
+    table = model.__table__
+    existing = index_names(conn, table.name)
+    
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(conn)
+
+def backfill_location_grid(conn):
+    """Fill lat_q/lon_q for locations created before the grid columns existed."""
+    add_missing_columns(conn, Location, 'lat_q', 'lon_q')
+    create_missing_indexes(conn, Location)
+    
+    total = 0
+    while True:
+        rows = conn.execute(
+            select(Location.id, Location.latitude, Location.longitude)
+            .where((Location.lat_q.is_(None)) | (Location.lon_q.is_(None)))
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        
+        # Rounded in Python, exactly as lookups snap request coordinates
+        conn.execute(
+            update(Location.__table__)
+            .where(Location.__table__.c.id == bindparam('row_id'))
+            .values(lat_q=bindparam('grid_lat'), lon_q=bindparam('grid_lon')),
+            [
+                {
+                    'row_id': row.id,
+                    'grid_lat': quantize_coordinate(row.latitude),
+                    'grid_lon': quantize_coordinate(row.longitude)
+                }
+                for row in rows
+            ]
+        )
+        total += len(rows)
+    
+    if total:
+        logger.info(f"Backfilled grid coordinates for {total} locations")
+
+def hash_legacy_api_keys(conn):
+    """Replace plaintext API keys with their hashes, which lookups match on."""
+    add_missing_columns(conn, ApiKey, 'key_hash', 'key_prefix')
+    create_missing_indexes(conn, ApiKey)
+    
+    table = ApiKey.__table__
+    total = 0
+    while True:
+        rows = conn.execute(
+            select(table.c.id, table.c.key)
+            .where(table.c.key.isnot(None), table.c.key_hash.is_(None))
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        
+        conn.execute(
+            update(table)
+            .where(table.c.id == bindparam('row_id'))
+            .values(key_hash=bindparam('new_hash'), key_prefix=bindparam('new_prefix'), key=None),
+            [
+                {
+                    'row_id': row.id,
+                    'new_hash': ApiKey.hash_key(row.key),
+                    'new_prefix': row.key[:8]
+                }
+                for row in rows
+            ]
+        )
+        total += len(rows)
+    
+    if total:
+        logger.info(f"Hashed {total} legacy API keys")
+
+def create_query_indexes(conn):
+    """Add the lookup and time-window indexes declared on the weather models."""
+    for model in (WeatherData, Forecast, WeatherAlert, PredictionAccuracy):
+        create_missing_indexes(conn, model)
+
+def dedupe_device_identity(conn):
+    """
+    Merge devices that share an identity, then add ix_device_identity.
+    
+    For each identity the most recently connected row is kept and the
+    others' computation time and task counts are added to it.
+    """
+    table = Device.__table__
+    if 'ix_device_identity' in index_names(conn, table.name):
+        return
+    
+    # Replaced by ix_device_identity, which also treats NULLs as equal
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(f'ALTER TABLE "{table.name}" DROP CONSTRAINT IF EXISTS uq_device_identity'))
+    
+    survivors = {}
+    merged = {}
+    duplicates = []
+    rows = conn.execute(
+        select(
+            table.c.id, table.c.user_id, table.c.ip_address, table.c.device_type,
+            table.c.browser_type, table.c.total_computation_time, table.c.total_tasks_completed
+        ).order_by(table.c.last_connected.desc().nullslast(), table.c.id.desc())
+    )
+    for row in rows:
+        identity = (row.user_id or 0, row.ip_address or '', row.device_type or '', row.browser_type or '')
+        survivor_id = survivors.setdefault(identity, row.id)
+        if survivor_id == row.id:
+            continue
+        
+        totals = merged.setdefault(survivor_id, [0, 0])
+        totals[0] += row.total_computation_time or 0
+        totals[1] += row.total_tasks_completed or 0
+        duplicates.append(row.id)
+    
+    if merged:
+        conn.execute(
+            update(table)
+            .where(table.c.id == bindparam('row_id'))
+            .values(
+                total_computation_time=db.func.coalesce(table.c.total_computation_time, 0) + bindparam('extra_time'),
+                total_tasks_completed=db.func.coalesce(table.c.total_tasks_completed, 0) + bindparam('extra_tasks')
+            ),
+            [
+                {'row_id': device_pk, 'extra_time': extra_time, 'extra_tasks': extra_tasks}
+                for device_pk, (extra_time, extra_tasks) in merged.items()
+            ]
+        )
+    for start in range(0, len(duplicates), BACKFILL_BATCH_SIZE):
+        conn.execute(delete(table).where(table.c.id.in_(duplicates[start:start + BACKFILL_BATCH_SIZE])))
+    
+    create_missing_indexes(conn, Device)
+    if duplicates:
+        logger.info(f"Merged {len(duplicates)} duplicate devices")
+
+# Applied in order; each must be safe to run again
+MIGRATIONS = (
+    backfill_location_grid,
+    hash_legacy_api_keys,
+    create_query_indexes,
+    dedupe_device_identity,
+)
+
+def run_migrations():
+    """
+    Apply all migrations in one transaction.
+    
+    On PostgreSQL an advisory lock keeps concurrently starting workers from
+    migrating at the same time; the ones that wait find nothing left to do.
+    """
+    with db.engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text('SELECT pg_advisory_xact_lock(:lock_id)'), {'lock_id': MIGRATION_LOCK_ID})
+        
+        for migration in MIGRATIONS:
+            migration(conn)
@@ -11,6 +11,17 @@ import math
 import datetime
 from typing import Dict, List, Any, Optional, Tuple, Union
 
+# Diurnal temperature factor for each hour of the day (cooler at night, warmer during day)
+DIURNAL_FACTORS = tuple(math.sin(math.pi * (hour - 4) / 12) for hour in range(24))
+
+# Distance of each offset in the 11x11 map grid from its center
+GRID_OFFSETS = range(-5, 6)
+GRID_DISTANCES = {
+    (lat_offset, lon_offset): math.sqrt(lat_offset**2 + lon_offset**2)
+    for lat_offset in GRID_OFFSETS
+    for lon_offset in GRID_OFFSETS
+}
+
 
 def generate_chart_data(data_type: str, location: Optional[Dict] = None) -> Dict[str, Any]:
     """
@@ -57,8 +68,7 @@ def _generate_temperature_forecast(location: Optional[Dict] = None) -> Dict[str,
     for i in range(hours):
         hour = (now + datetime.timedelta(hours=i)).hour
         # Diurnal variation (cooler at night, warmer during day)
-        diurnal_factor = math.sin(math.pi * (hour - 4) / 12)
-        temp = base_temp + (5 * diurnal_factor) + random.uniform(-1, 1)
+        temp = base_temp + (5 * DIURNAL_FACTORS[hour]) + random.uniform(-1, 1)
         temperatures.append(round(temp, 1))
     
     # Feels like temperature (usually slightly different)
@@ -330,7 +340,7 @@ def _generate_temperature_map(location: Optional[Dict] = None) -> Dict[str, Any]
             lon = center['longitude'] + (lon_offset * 0.1)
             
             # Temperature varies with distance from center and some randomness
-            distance = math.sqrt(lat_offset**2 + lon_offset**2)
+            distance = GRID_DISTANCES[lat_offset, lon_offset]
             temp_variation = distance * random.uniform(-0.5, 0.5)
             
             temperature = base_temp + temp_variation
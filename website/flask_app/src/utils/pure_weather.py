@@ -12,6 +12,9 @@ import datetime
 import requests
 from typing import Dict, List, Any, Optional, Tuple, Union
 
+# Temperature offset for each hour of the day, peaking mid-afternoon
+DIURNAL_VARIATION = tuple(3 * math.sin(math.pi * (hour - 4) / 12) for hour in range(24))
+
 
 class WeatherData:
     """Class for handling weather data without native dependencies."""
@@ -186,8 +189,8 @@ class WeatherData:
     def _get_diurnal_variation(self, hour: int) -> float:
         """Calculate temperature variation based on time of day."""
         # Temperature typically peaks around 2-3 PM (hour 14-15) and bottoms out around 4-5 AM (hour 4-5)
-        # Using a sinusoidal pattern with peak at hour 14
-        return 3 * math.sin(math.pi * (hour - 4) / 12)
+        # Using a sinusoidal pattern with peak at hour 14, precomputed per hour
+        return DIURNAL_VARIATION[hour % 24]
 
 
 # Singleton instance
@@ -0,0 +1,27 @@
+"""
+Query helpers for Toronto AI Weather web application.
+"""
+
+from flask import current_app
+from sqlalchemy.orm import raiseload
+
+def strict_query(model, *loads):
+    """
+    Start a query that refuses lazy relationship loads in debug mode.
+    
+    In debug mode any relationship not loaded through the given loader
+    options raises instead of silently issuing one query per row, so N+1
+    patterns in views and templates show up during development. In
+    production the query behaves like model.query.
+    
+    Args:
+        model: Model class to query
+        *loads: Loader options for relationships the caller needs, e.g. selectinload(...)
+    
+    Returns:
+        Query: Query for the model
+    """
+    query = model.query.options(*loads) if loads else model.query
+    if current_app.debug:
+        query = query.options(raiseload('*'))
+    return query
@@ -0,0 +1,71 @@
+"""
+API rate limiting for Toronto AI Weather web application.
+
+Quota consumption is tracked in Redis token buckets, one per user and
+period, so API requests never touch the ApiQuota row.
+"""
+
+import os
+import time
+import logging
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+DAILY_PERIOD = 86400  # seconds
+MONTHLY_PERIOD = 30 * 86400  # seconds
+
+# Refill every bucket by elapsed * capacity / period, then take one token from
+# each only if all of them have one. A capacity of 0 means unlimited.
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local period = tonumber(ARGV[i * 2 + 1])
+    if capacity > 0 then
+        local state = redis.call('HMGET', key, 'tokens', 'ts')
+        local available = tonumber(state[1]) or capacity
+        local ts = tonumber(state[2]) or now
+        available = math.min(capacity, available + (now - ts) * capacity / period)
+        if available < 1 then
+            return 0
+        end
+        tokens[i] = available
+    end
+end
+for i, key in ipairs(KEYS) do
+    if tokens[i] then
+        redis.call('HSET', key, 'tokens', tostring(tokens[i] - 1), 'ts', tostring(now))
+        redis.call('EXPIRE', key, ARGV[i * 2 + 1])
+    end
+end
+return 1
+"""
+
+_redis_url = os.environ.get('REDIS_URL')
+redis_client = redis.Redis.from_url(_redis_url) if _redis_url else None
+_consume = redis_client.register_script(TOKEN_BUCKET_SCRIPT) if redis_client else None
+
+def consume_quota(user_id, daily_limit, monthly_limit):
+    """
+    Take one request from a user's daily and monthly quota.
+    
+    Args:
+        user_id (int): User ID
+        daily_limit (int): Requests per day, 0 for unlimited
+        monthly_limit (int): Requests per month, 0 for unlimited
+    
+    Returns:
+        bool: True if the request is within quota
+    """
+    try:
+        return bool(_consume(
+            keys=[f'quota:{user_id}:daily', f'quota:{user_id}:monthly'],
+            args=[time.time(), daily_limit or 0, DAILY_PERIOD, monthly_limit or 0, MONTHLY_PERIOD]
+        ))
+    except redis.RedisError as e:
+        # Fail open: an unavailable limiter should not take the API down with it
+        logger.error(f"Error checking API quota: {e}")
+        return True
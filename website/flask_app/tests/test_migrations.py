@@ -0,0 +1,18 @@
+"""
+Tests for the startup migrations of Toronto AI Weather web application.
+
+Run from website/flask_app with: python -m pytest tests
+"""
+
+from src.main import app, db
+from src.utils.migrations import index_names, run_migrations
+
+def test_run_migrations_twice():
+    """Migrations run on every start, after create_all() has built the current schema."""
+    with app.app_context():
+        db.create_all()
+        run_migrations()
+        run_migrations()
+        
+        with db.engine.connect() as conn:
+            assert 'ix_device_identity' in index_names(conn, 'device')